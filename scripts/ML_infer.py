@@ -3,41 +3,112 @@
 ml_infer.py
 Load inference features and a trained model, predict best source,
 and output ML_BEST_ATTRIBUTES.csv (per place_id predictions).
+
+The features are streamed in batches of --batch-rows rows (Parquet row
+groups, or chunks of a legacy CSV) and every batch's predictions are
+appended to the output, so the feature rows held in memory are bounded by
+the batch size. The one thing that grows with the input is the set of
+place_ids already written (one entry per distinct place), which keeps the
+first-row-per-place_id output exact for features in any order.
+
+With --compiled the model is the NumPy export of compiled_models.py
+(random_forest_name.npz): no sklearn import and a much faster load, the
+better choice for small inputs; the pickled forest is faster on large ones.
 """
+import argparse
+import os
 import pandas as pd
+import pyarrow.parquet as pq
 import joblib
 from pathlib import Path
 import numpy as np
 
-INFER_FILE = "../data/processed/ML_INFER_FEATURES_name.csv"
+from compiled_models import load_compiled, compiled_path
+
+INFER_FILE = "../data/processed/ML_INFER_FEATURES_name.parquet"
 MODEL_FILE = "../models/random_forest_name.pkl"
 OUT = "../data/processed/ML_BEST_ATTRIBUTES.csv"
+BATCH_ROWS = 100_000
+
+NON_FEATURE_COLS = ['place_id','business_id','omf_name','overpass_name','name','name_true','label']
+NAME_COLS = ['name', 'omf_name', 'overpass_name']  # by predicted source: 0=Yelp,1=OMF,2=Overpass
+
+
+def feature_batches(path, batch_rows=BATCH_ROWS):
+    """DataFrames of at most batch_rows inference rows, without the columns prediction does not use."""
+    if str(path).endswith(".parquet"):
+        pf = pq.ParquetFile(path)
+        columns = [c for c in pf.schema_arrow.names if c not in ('business_id', 'name_true', 'label')]
+        for batch in pf.iter_batches(batch_size=batch_rows, columns=columns):
+            yield batch.to_pandas()
+    else:
+        yield from pd.read_csv(path, chunksize=batch_rows)
+
+
+def column(df, col):
+    return df[col].to_numpy(dtype=object) if col in df.columns else np.full(len(df), None, dtype=object)
+
+
+def pick_names(df, pred):
+    """Name of the predicted source for every row (the Yelp name for any other prediction)."""
+    yelp, omf, overpass = (column(df, c) for c in NAME_COLS)
+    return np.select([pred == 1, pred == 2], [omf, overpass], default=yelp)
+
+
+def load_model(model_file=MODEL_FILE, compiled=False, n_jobs=None):
+    """The pickled forest (n_jobs overridden when given), or its compiled NumPy export."""
+    if compiled:
+        model = load_compiled(compiled_path(model_file))
+        print(f"Compiled model loaded ({compiled_path(model_file)}).")
+        return model
+    model = joblib.load(model_file)
+    if n_jobs is not None:
+        model.n_jobs = n_jobs
+    print(f"Model loaded (n_jobs={model.n_jobs}).")
+    return model
 
-print("Loading inference features...")
-df = pd.read_csv(INFER_FILE)
-model = joblib.load(MODEL_FILE)
-print("Model loaded.")
 
-feature_cols = [c for c in df.columns if c not in ['place_id','business_id','omf_name','overpass_name','name','name_true','label']]
-X = df[feature_cols].fillna(0).values
+def infer(infer_file=INFER_FILE, model_file=MODEL_FILE, out=OUT, batch_rows=BATCH_ROWS, n_jobs=None,
+          compiled=False):
+    """
+    Predict the best name source batch by batch and append one row per
+    place_id (its first row in the features) to out. Returns (rows, places).
+    """
+    model = load_model(model_file, compiled, n_jobs)
 
-print("Predicting...")
-pred = model.predict(X)
-df['best_source_pred'] = pred  # 0=Yelp,1=OMF,2=Overpass
+    seen = set()  # place_ids already written; drop_duplicates across batches (grows with the places)
+    n_rows = n_places = 0
+    tmp = Path(f"{out}.tmp")
+    with open(tmp, "w", newline="", encoding="utf-8") as f:
+        f.write("place_id,best_name_pred\n")
+        for i, df in enumerate(feature_batches(infer_file, batch_rows)):
+            feature_cols = [c for c in df.columns if c not in NON_FEATURE_COLS]
+            X = df[feature_cols].fillna(0).values
+            pred = model.predict(X)
 
-def pick_name(row):
-    if row['best_source_pred'] == 0:
-        return row.get('name')
-    elif row['best_source_pred'] == 1:
-        return row.get('omf_name')
-    elif row['best_source_pred'] == 2:
-        return row.get('overpass_name')
-    return row.get('name')
+            batch = pd.DataFrame({'place_id': df['place_id'], 'best_name_pred': pick_names(df, pred)})
+            batch = batch.drop_duplicates('place_id')
+            batch = batch[~batch['place_id'].isin(seen)]
+            seen.update(batch['place_id'])
 
-df['best_name_pred'] = df.apply(pick_name, axis=1)
+            batch.to_csv(f, header=False, index=False)
+            n_rows += len(df)
+            n_places += len(batch)
+            print(f"  batch {i+1}: {n_rows:,} rows, {n_places:,} places")
+    os.replace(tmp, out)
+    return n_rows, n_places
 
-out = df[['place_id','best_name_pred']].drop_duplicates('place_id').copy()
 
-out.to_csv(OUT, index=False)
-print(f"Saved best attributes to {OUT} ({len(out):,} places)")
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Predict the best name source per place in streaming batches.")
+    parser.add_argument("--batch-rows", type=int, default=BATCH_ROWS,
+                        help="feature rows read and predicted per batch")
+    parser.add_argument("--jobs", type=int, default=None,
+                        help="n_jobs for the forest's predict (default: the value it was trained with)")
+    parser.add_argument("--compiled", action="store_true",
+                        help="predict with the NumPy export of the model instead of the sklearn pickle")
+    args = parser.parse_args()
 
+    print("Predicting...")
+    n_rows, n_places = infer(batch_rows=args.batch_rows, n_jobs=args.jobs, compiled=args.compiled)
+    print(f"Saved best attributes to {OUT} ({n_places:,} places)")
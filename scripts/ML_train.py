@@ -4,6 +4,7 @@ ml_train.py
 Train a model for the name attribute and save it.
 Outputs:
  - models/random_forest_name.pkl
+ - models/random_forest_name.npz   (compiled_models.py export, for ML_infer.py --compiled)
  - ../data/processed/ML_BEST_ATTRIBUTES.csv   (feature importances)
 """
 import pandas as pd
@@ -14,19 +15,21 @@ from sklearn.metrics import classification_report, accuracy_score
 import joblib
 import numpy as np
 
+from compiled_models import export_model, compiled_path
+
 trip = pd.read_csv("../data/processed/yelp_triplet_matches_with_gaps.csv", dtype=str)
 gt = pd.read_csv("../data/processed/yelp_ground_truth.csv", dtype=str)
 print(trip[['name','omf_name','overpass_name']].head())
 print(gt.head())
 
-TRAIN_FILE = "../data/processed/ML_TRAIN_FEATURES_name.csv"
+TRAIN_FILE = "../data/processed/ML_TRAIN_FEATURES_name.parquet"
 MODEL_DIR = Path("../models")
 MODEL_DIR.mkdir(parents=True, exist_ok=True)
 MODEL_OUT = MODEL_DIR / "random_forest_name.pkl"
 OUT_IMP = "../data/processed/ML_BEST_ATTRIBUTES.csv"
 
 print("Loading training features...")
-df = pd.read_csv(TRAIN_FILE)
+df = pd.read_parquet(TRAIN_FILE)
 
 df = df[df['label'].notna()].copy()
 y = df['label'].astype(int)
@@ -58,3 +61,6 @@ print(f"Saved feature importances to {OUT_IMP}")
 joblib.dump(model, MODEL_OUT)
 print(f"Saved model to {MODEL_OUT}")
 
+export_model(model, compiled_path(MODEL_OUT))
+print(f"Saved compiled model to {compiled_path(MODEL_OUT)}")
+
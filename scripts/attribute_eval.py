@@ -0,0 +1,236 @@
+#!/usr/bin/env python3
+"""
+attribute_eval.py
+
+Evaluate a best-attributes output (RULE_BEST_ATTRIBUTES.csv or
+ML_BEST_ATTRIBUTES.csv) against a golden dataset, for every attribute in
+one pass. Truth and prediction columns are normalized a whole column at a
+time and compared with rapidfuzz's elementwise cpdist: a prediction is
+correct when it equals the truth or scores fuzz.ratio >= MATCH_SCORE.
+
+Per attribute, with t / p the non-empty normalized truths / predictions:
+  accuracy  = correct / rows with both t and p
+  precision = correct / rows with p
+  recall    = correct / rows with t
+  F1        = harmonic mean of precision and recall
+
+Usage: python attribute_eval.py [--gold GOLD.csv] [--pred PRED.csv] [--debug [ATTR ...]]
+--debug prints truth, prediction and score per row (all attributes when
+none are named); without it only the metrics are printed.
+"""
+
+import argparse
+import json
+
+import numpy as np
+import pandas as pd
+from rapidfuzz import fuzz
+from rapidfuzz.process import cpdist
+
+GOLD_FILE = "RULE_GOLDEN_DATASET.csv"
+PRED_FILE = "RULE_BEST_ATTRIBUTES.csv"
+MATCH_SCORE = 90
+
+# attribute -> (truth column, prediction column candidates); the ML output names it best_categories
+ATTRS = {
+    "name":       ("truth_name", ["best_name"]),
+    "phone":      ("truth_phone", ["best_phone"]),
+    "address":    ("truth_address", ["best_address"]),
+    "categories": ("truth_categories", ["best_category", "best_categories"]),
+    "website":    ("truth_website", ["best_website"]),
+}
+
+ADDRESS_PARTS = ["freeform", "locality", "region", "postcode"]  # the order of the golden truth_address
+NON_WORD = r"[\W_]+"  # anything but letters and digits (str.isalnum)
+
+
+# ======================================================
+# COLUMN NORMALIZERS (Series of raw text -> Series of str)
+# Columns are kept as object dtype so the .str regexes always run in Python's
+# re (Unicode \W), whatever string dtype and engine pandas would pick.
+# ======================================================
+
+def text(s):
+    """The column as object dtype, missing values as ""."""
+    return s.astype(object).fillna("")
+
+
+def parse_json(val):
+    try:
+        return json.loads(val)
+    except ValueError:
+        return val
+
+
+def json_map(s, fn):
+    """fn(parsed value) for the values that look like JSON objects / lists, the others unchanged."""
+    s = text(s)
+    is_json = s.str.lstrip().str[:1].isin(["{", "["]).to_numpy()
+    if not is_json.any():
+        return s
+    out = s.to_numpy(dtype=object, copy=True)
+    out[is_json] = [fn(parse_json(v)) for v in out[is_json]]
+    return pd.Series(out, index=s.index, dtype=object)
+
+
+def first_item(v):
+    """The first element of a JSON list ("" when empty)."""
+    if isinstance(v, list):
+        return str(v[0]) if v else ""
+    return str(v)
+
+
+def clean_text(s):
+    s = text(s).str.lower().str.replace(NON_WORD, " ", regex=True)
+    return s.str.strip()
+
+
+def clean_phone(s):
+    """Digits only, the last 10 (US numbers, with or without +1)."""
+    return json_map(s, first_item).str.replace(r"\D", "", regex=True).str[-10:]
+
+
+def clean_website(s):
+    """Bare host: lowercase, no scheme, no www., nothing after the first /."""
+    s = json_map(s, first_item).str.lower()
+    for prefix in ["https://", "http://", "www."]:
+        s = s.str.replace(prefix, "", regex=False)
+    return s.str.replace(r"(?s)/.*", "", regex=True)
+
+
+def category_text(v):
+    if isinstance(v, dict):
+        return str(v.get("primary") or "")
+    if isinstance(v, list):
+        return " ".join(str(x) for x in v)
+    return str(v)
+
+
+def clean_category(s):
+    """The primary category of {"primary", "alternate"} objects, lists joined, lowercase."""
+    return json_map(s, category_text).str.lower()
+
+
+def address_text(v):
+    if isinstance(v, list):
+        v = v[0] if v else ""
+    if isinstance(v, dict):
+        return " ".join(str(v.get(k) or "") for k in ADDRESS_PARTS)
+    return str(v)
+
+
+def clean_address(s):
+    """The first address of JSON address lists as "freeform locality region postcode", then clean_text."""
+    return clean_text(json_map(s, address_text))
+
+
+NORMALIZERS = {
+    "name": clean_text,
+    "phone": clean_phone,
+    "address": clean_address,
+    "categories": clean_category,
+    "website": clean_website,
+}
+
+
+# ======================================================
+# EVALUATION
+# ======================================================
+
+def load_merged(gold_file=GOLD_FILE, pred_file=PRED_FILE):
+    """Golden rows joined to their predictions on place_id, every column as text."""
+    gold = pd.read_csv(gold_file, dtype=str)
+    pred = pd.read_csv(pred_file, dtype=str)
+    return gold.merge(pred, on="place_id", how="inner", suffixes=("", "_pred"))
+
+
+def compare(df, attr):
+    """
+    Normalized truth and prediction columns of one attribute, their fuzz.ratio
+    scores (0 where either is empty) and the boolean match column.
+    """
+    truth_col, pred_cols = ATTRS[attr]
+    normalize = NORMALIZERS[attr]
+    pred_col = next((c for c in pred_cols if c in df.columns), None)
+    empty = pd.Series("", index=df.index)
+
+    t = normalize(df[truth_col]) if truth_col in df.columns else empty
+    p = normalize(df[pred_col]) if pred_col else empty
+    both = ((t != "") & (p != "")).to_numpy()
+
+    scores = np.zeros(len(df))
+    if both.any():
+        scores[both] = cpdist(t[both].tolist(), p[both].tolist(), scorer=fuzz.ratio, workers=-1)
+    match = both & ((t == p).to_numpy() | (scores >= MATCH_SCORE))
+    return pd.DataFrame({"place_id": df["place_id"], "truth": t, "pred": p, "score": scores, "match": match})
+
+
+def metrics(cmp):
+    has_truth = (cmp["truth"] != "").sum()
+    has_pred = (cmp["pred"] != "").sum()
+    both = ((cmp["truth"] != "") & (cmp["pred"] != "")).sum()
+    correct = cmp["match"].sum()
+
+    precision = correct / has_pred if has_pred else 0.0
+    recall = correct / has_truth if has_truth else 0.0
+    return {
+        "accuracy": correct / both if both else 0.0,
+        "precision": precision,
+        "recall": recall,
+        "f1": 2 * precision * recall / (precision + recall) if precision + recall else 0.0,
+        "rows": int(both),
+    }
+
+
+def print_debug(attr, cmp):
+    print(f"\n--- {attr} ---")
+    for r in cmp.itertuples(index=False):
+        print(f"Truth   : '{r.truth}'")
+        print(f"Pred    : '{r.pred}'")
+        print(f"Fuzzy % : {r.score:.0f}{'' if r.match else '  (no match)'}")
+        print("-" * 40)
+
+
+def evaluate(gold_file=GOLD_FILE, pred_file=PRED_FILE, attrs=ATTRS, debug=()):
+    """Metrics per attribute ({attr: {accuracy, precision, recall, f1, rows}}), per-row output for debug attrs."""
+    df = load_merged(gold_file, pred_file)
+    results = {}
+    for attr in attrs:
+        cmp = compare(df, attr)
+        if attr in debug:
+            print_debug(attr, cmp)
+        results[attr] = metrics(cmp)
+    return results
+
+
+def print_report(results):
+    keys = ["accuracy", "precision", "recall", "f1"]
+    print(f"\n{'ATTRIBUTE':<12} | {'ACCURACY':<10} | {'PRECISION':<10} | {'RECALL':<10} | {'F1 SCORE':<10}")
+    print("-" * 65)
+    for attr, m in results.items():
+        print(f"{attr:<12} | " + " | ".join(f"{m[k] * 100:6.2f}%   " for k in keys))
+    if results:
+        print("-" * 65)
+        print(f"{'OVERALL':<12} | " +
+              " | ".join(f"{np.mean([m[k] for m in results.values()]) * 100:6.2f}%   " for k in keys))
+
+
+def main(gold_file=GOLD_FILE, pred_file=PRED_FILE, argv=None):
+    parser = argparse.ArgumentParser(description="Accuracy, precision, recall and F1 of best attributes vs a golden set.")
+    parser.add_argument("--gold", default=gold_file, help=f"golden dataset (default: {gold_file})")
+    parser.add_argument("--pred", default=pred_file, help=f"best-attributes output (default: {pred_file})")
+    parser.add_argument("--debug", nargs="*", choices=list(ATTRS), metavar="ATTR",
+                        help="print every row's truth, prediction and score (all attributes if none given)")
+    args = parser.parse_args(argv)
+
+    debug = () if args.debug is None else (args.debug or list(ATTRS))
+    try:
+        results = evaluate(args.gold, args.pred, debug=debug)
+    except FileNotFoundError as e:
+        print(f"Error: {e.filename} not found.")
+        return
+    print_report(results)
+
+
+if __name__ == "__main__":
+    main()
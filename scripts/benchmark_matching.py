@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+"""
+benchmark_matching.py
+
+Per-chunk timing of the Yelp -> OMF matcher: file-order chunks against the
+full target index vs Hilbert-ordered chunks against a clipped local index.
+Both orderings match the same Yelp rows: a seeded random sample of
+--chunks chunks' worth of rows (or every row with --all), chunked once in
+file order and once in the Hilbert order of the full frame, so the totals
+compare like for like.
+Nothing is written to ../data/interim.
+
+Usage: python benchmark_matching.py [--chunks N] [--seed S] [--all]
+"""
+
+import argparse
+import time
+
+import numpy as np
+
+from matchingdatasets import (load_inputs, chunk_ranges, spatial_order, clip_targets, process_chunk,
+                              CHUNK_SIZE)
+
+
+def time_chunks(yelp_proj, target_proj, target_index, ranges, clip):
+    times = []
+    for i, start, end in ranges:
+        yelp_chunk = yelp_proj.iloc[start:end].copy()
+        t0 = time.time()
+        tp, ti = clip_targets(yelp_chunk, target_proj, target_index) if clip else (target_proj, target_index)
+        process_chunk(yelp_chunk, tp, ti)
+        times.append(time.time() - t0)
+        print(f"  chunk {i+1}: {times[-1]:.2f}s ({len(tp):,} targets)")
+    return np.array(times)
+
+
+def sample_rows(n, n_rows, seed):
+    """Sorted positions of n_rows Yelp rows drawn at random (all rows when n_rows >= n)."""
+    if n_rows >= n:
+        return np.arange(n)
+    return np.sort(np.random.default_rng(seed).choice(n, size=n_rows, replace=False))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark file-order vs Hilbert-ordered chunk matching.")
+    parser.add_argument("--chunks", type=int, default=5, help="chunks' worth of sampled Yelp rows to time")
+    parser.add_argument("--seed", type=int, default=0, help="seed of the row sample")
+    parser.add_argument("--all", action="store_true", help="time every Yelp row instead of a sample")
+    args = parser.parse_args()
+
+    yelp_proj, omf_proj, _ = load_inputs()
+    omf_index = omf_proj.sindex
+    rows = sample_rows(len(yelp_proj), len(yelp_proj) if args.all else args.chunks * CHUNK_SIZE, args.seed)
+    print(f"Timing the same {len(rows):,} of {len(yelp_proj):,} Yelp rows in both orders")
+
+    # Hilbert order of the full frame, restricted to the sampled rows
+    hilbert_proj = spatial_order(yelp_proj)
+    hilbert_proj = hilbert_proj[np.isin(hilbert_proj["yelp_row"].to_numpy(), rows)]
+    ranges = chunk_ranges(len(rows))
+
+    print("\nFile order, full target index:")
+    base = time_chunks(yelp_proj.iloc[rows], omf_proj, omf_index, ranges, clip=False)
+
+    print("\nHilbert order, clipped target index:")
+    hilbert = time_chunks(hilbert_proj, omf_proj, omf_index, ranges, clip=True)
+
+    print("\n=== SUMMARY (same rows, chunked in each order) ===")
+    print(f"File order : total {base.sum():.2f}s, per chunk mean {base.mean():.2f}s, median {np.median(base):.2f}s")
+    print(f"Hilbert    : total {hilbert.sum():.2f}s, per chunk mean {hilbert.mean():.2f}s, "
+          f"median {np.median(hilbert):.2f}s")
+    print(f"Speedup    : {base.sum() / max(hilbert.sum(), 1e-9):.2f}x (total)")
@@ -0,0 +1,146 @@
+"""
+blocking.py
+
+Candidate blocking for the OMF <-> Yelp validators (sourcesComparison.py and
+sourceComparison_smaller.py). Instead of scoring an OMF record against every
+Yelp record of its city, it is only scored against Yelp records sharing at
+least one blocking key:
+  - a name token that is not too common (very common tokens are dropped by IDF)
+  - the street number, qualified by the postal code when one is known
+  - the phone number, so the phone == phone rule of calculate_score never loses a pair
+calculate_score_above is the validators' shared cutoff scorer for the pairs
+that survive blocking.
+"""
+
+import math
+from collections import Counter, defaultdict
+
+import pandas as pd
+from rapidfuzz import fuzz
+
+MIN_TOKEN_IDF = 3.0   # tokens in more than ~5% (e^-3) of Yelp names are too common to block on
+MIN_TOKEN_DOCS = 25   # ...but a token is never "common" below this many names
+
+
+def name_tokens(name):
+    return set(str(name).split()) if name else set()
+
+
+def common_name_tokens(names):
+    """Name tokens whose IDF over the given names is below MIN_TOKEN_IDF ("the", "inc", ...)."""
+    names = list(names)
+    df = Counter(tok for n in names for tok in name_tokens(n))
+    return {t for t, c in df.items() if c >= MIN_TOKEN_DOCS and math.log(len(names) / c) < MIN_TOKEN_IDF}
+
+
+def blocking_keys(rec, common_tokens):
+    """Blocking keys of a cleaned OMF/Yelp record (dict or pandas row)."""
+    keys = {("name", t) for t in name_tokens(rec.get("name")) if t not in common_tokens}
+
+    addr = str(rec.get("street") or rec.get("addr") or "").split()
+    if addr and addr[0].isdigit():
+        postal = str(rec.get("postal") or "")[:5]
+        keys.add(("num", addr[0], postal))
+
+    if rec.get("phone"):
+        keys.add(("phone", rec["phone"]))
+    return keys
+
+
+def build_block_index(records, common_tokens):
+    """Inverted index: blocking key -> positions of the records carrying it."""
+    index = defaultdict(list)
+    for pos, rec in enumerate(records):
+        for key in blocking_keys(rec, common_tokens):
+            index[key].append(pos)
+    return index
+
+
+def block_candidates(index, rec, common_tokens):
+    """Positions of indexed records sharing a key with rec, in original order."""
+    hits = set()
+    for key in blocking_keys(rec, common_tokens):
+        hits.update(index.get(key, ()))
+    return sorted(hits)
+
+
+def phone_matches(omf_df, yelp_df):
+    """
+    Exact phone hash join within a city, done once for the whole OMF frame.
+    Returns {OMF row label: Yelp record} with the first same-city Yelp record
+    (in Yelp order) carrying the same 10-digit phone, i.e. the record the
+    fuzzy loop would stop at with a score of 100.
+    """
+    yelp = yelp_df[(yelp_df["phone"].str.len() == 10) & (yelp_df["city"] != "")]
+    yelp = yelp.drop_duplicates(["city", "phone"], keep="first")
+    omf = omf_df.loc[omf_df["phone"].str.len() == 10, ["city", "phone"]]
+    joined = omf.reset_index(names="omf_label").merge(yelp, on=["city", "phone"], how="inner")
+    return dict(zip(joined["omf_label"], joined.drop(columns="omf_label").to_dict("records")))
+
+
+def calculate_score_above(omf_row, yelp_row, must_beat):
+    """
+    The validators' calculate_score (phone match = 100, else 65% name + 35%
+    address token_sort_ratio) for the matching loop, where a pair only counts
+    if it scores above must_beat. Returns (score, addr_skipped); score is None
+    when the pair provably cannot beat must_beat. Both comparisons get
+    rapidfuzz score cutoffs, and the address one is skipped when the name
+    score alone caps the weighted total at must_beat. A returned score is
+    bit-identical to calculate_score.
+    """
+    if omf_row["phone"] and yelp_row["phone"] and omf_row["phone"] == yelp_row["phone"]:
+        return 100, False
+
+    # the 1e-9 slack keeps float rounding of the cutoffs on the safe side
+    ns = fuzz.token_sort_ratio(omf_row["name"], yelp_row["name"],
+                               score_cutoff=max(0.0, (must_beat - 35) / 0.65 - 1e-9))
+    if (0.65 * ns) + (0.35 * 100) <= must_beat:
+        return None, True
+    ad = fuzz.token_sort_ratio(omf_row["addr"], yelp_row["addr"],
+                               score_cutoff=max(0.0, (must_beat - 0.65 * ns) / 0.35 - 1e-9))
+    score = (0.65 * ns) + (0.35 * ad)
+    return (score if score > must_beat else None), False
+
+
+def load_golden_pairs(path):
+    """(omf place_id, yelp business_id) pairs of a golden/valid-matches CSV."""
+    df = pd.read_csv(path, dtype=str)
+    place_col = "omf_place_id" if "omf_place_id" in df.columns else "place_id"
+    df = df.dropna(subset=[place_col, "yelp_business_id"])
+    return set(zip(df[place_col], df["yelp_business_id"]))
+
+
+def blocking_recall(omf_df, yelp_df, golden_pairs, common_tokens):
+    """
+    Share of golden pairs (present in both frames, same city) that share a
+    blocking key, i.e. that the blocked validator still gets to score.
+    Returns (kept, total).
+    """
+    omf_by_id = {pid: g.to_dict("records") for pid, g in omf_df.groupby("place_id")}
+    yelp_by_id = {r["business_id"]: r for r in yelp_df.to_dict("records")}
+
+    kept = total = 0
+    for pid, bid in golden_pairs:
+        y = yelp_by_id.get(bid)
+        omf_rows = [o for o in omf_by_id.get(pid, []) if y is not None and o["city"] and o["city"] == y["city"]]
+        if not omf_rows:
+            continue
+        total += 1
+        y_keys = blocking_keys(y, common_tokens)
+        if any(blocking_keys(o, common_tokens) & y_keys for o in omf_rows):
+            kept += 1
+    return kept, total
+
+
+def report_blocking_recall(omf_df, yelp_df, golden_path, common_tokens):
+    try:
+        pairs = load_golden_pairs(golden_path)
+    except FileNotFoundError:
+        print(f"Golden file {golden_path} not found, skipping blocking recall.")
+        return
+    kept, total = blocking_recall(omf_df, yelp_df, pairs, common_tokens)
+    if total == 0:
+        print(f"No golden pairs from {golden_path} found in the loaded data.")
+        return
+    print(f"Blocking recall on {golden_path}: {kept}/{total} pairs kept "
+          f"({kept / total * 100:.2f}%, lost {(total - kept) / total * 100:.2f}%)")
@@ -0,0 +1,122 @@
+"""
+chunk_checkpoints.py
+
+Resumable chunk store for matchingdatasets.py.
+Each chunk result is written as GeoParquet next to a JSON manifest that records
+the chunk ranges, the input file hashes and the matching parameters. A rerun
+with the same inputs/parameters skips every chunk already marked done; if
+anything changed the manifest is reset and all chunks are redone.
+"""
+
+import hashlib
+import json
+import os
+from pathlib import Path
+
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+
+
+def file_sha256(path, block_size=1 << 20):
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+def chunk_file_path(chunk_prefix, i):
+    return Path(f"{chunk_prefix}_{i+1}.parquet")
+
+
+def manifest_path(chunk_prefix):
+    return Path(f"{chunk_prefix}_manifest.json")
+
+
+def write_json_atomic(obj, path):
+    tmp = Path(f"{path}.tmp")
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(obj, f, indent=2)
+    os.replace(tmp, path)
+
+
+def open_manifest(chunk_prefix, ranges, input_hashes, params):
+    """
+    Load the manifest for chunk_prefix, or start a fresh one if it is missing
+    or was written for different chunk ranges / inputs / parameters.
+    ranges: [(i, start, end), ...]  input_hashes: {path: sha256}  params: {name: value}
+    """
+    path = manifest_path(chunk_prefix)
+    expected = {
+        "ranges": [[i, start, end] for i, start, end in ranges],
+        "inputs": input_hashes,
+        "params": params,
+    }
+    if path.exists():
+        with open(path, encoding="utf-8") as f:
+            manifest = json.load(f)
+        if all(manifest.get(k) == v for k, v in expected.items()):
+            return manifest
+        print(f"Manifest {path} does not match current inputs/parameters, starting over.")
+
+    manifest = dict(expected, chunks={})
+    write_json_atomic(manifest, path)
+    return manifest
+
+
+def chunk_done(manifest, i, chunk_prefix):
+    entry = manifest["chunks"].get(str(i + 1))
+    return bool(entry and entry.get("done")) and chunk_file_path(chunk_prefix, i).exists()
+
+
+def mark_chunk_done(manifest, chunk_prefix, i, seconds):
+    """Record a finished chunk and persist the manifest immediately."""
+    chunk_file = chunk_file_path(chunk_prefix, i)
+    manifest["chunks"][str(i + 1)] = {
+        "file": chunk_file.name,
+        "done": True,
+        "seconds": round(seconds, 2),
+    }
+    write_json_atomic(manifest, manifest_path(chunk_prefix))
+
+
+def write_chunk(gdf, chunk_file):
+    """Write a chunk GeoParquet file; the rename keeps half-written files out of the store."""
+    tmp = Path(f"{chunk_file}.tmp")
+    gdf.to_parquet(tmp, index=False)
+    os.replace(tmp, chunk_file)
+
+
+def assemble_chunks(chunk_files, out_path):
+    """
+    Stream chunk files into one GeoParquet file, one chunk in memory at a time.
+    Column types are unified across chunks (e.g. an all-null chunk column is
+    cast to the type the other chunks use).
+    """
+    schemas = [pq.read_schema(p) for p in chunk_files]
+    schema = pa.unify_schemas(schemas, promote_options="permissive")
+
+    # keep only the GeoParquet metadata; the bbox of the first chunk is not the file's
+    geo = json.loads(schemas[0].metadata[b"geo"])
+    for col in geo.get("columns", {}).values():
+        col.pop("bbox", None)
+    schema = schema.with_metadata({b"geo": json.dumps(geo).encode("utf-8")})
+
+    tmp = Path(f"{out_path}.tmp")
+    with pq.ParquetWriter(tmp, schema) as writer:
+        for p in chunk_files:
+            writer.write_table(pq.read_table(p).select(schema.names).cast(schema))
+    os.replace(tmp, out_path)
+    return out_path
+
+
+def restore_row_order(path, column):
+    """Sort a Parquet file by an integer position column, then drop that column."""
+    table = pq.read_table(path)
+    table = table.take(pc.sort_indices(table, sort_keys=[(column, "ascending")]))
+    table = table.drop_columns([column])
+
+    tmp = Path(f"{path}.tmp")
+    pq.write_table(table, tmp)
+    os.replace(tmp, path)
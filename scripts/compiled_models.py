@@ -0,0 +1,225 @@
+#!/usr/bin/env python3
+"""
+compiled_models.py
+
+Export trained classifiers to plain NumPy arrays (.npz) and predict with
+them without importing sklearn. Loading a compiled model is a single
+np.load instead of unpickling hundreds of estimator objects, which is what
+dominates small online batches.
+
+  RandomForestClassifier: every tree flattened into one set of contiguous
+    node arrays (feature, threshold, left/right child, missing-value side,
+    per-node class fractions) plus the root node of each tree.
+  LogisticRegression: coef_ and intercept_.
+
+Both predictors reproduce sklearn's predict: forests compare float32 X to
+the float64 thresholds and sum the per-tree class fractions in tree order
+before the argmax, logistic models take the argmax (or the sign, for two
+classes) of X @ coef.T + intercept. predict_proba follows sklearn too:
+mean tree class fractions, or the logistic (two classes) / softmax of the
+decision function.
+
+Usage: python compiled_models.py MODEL.pkl|BUNDLE.joblib [...]
+writes MODEL.npz next to each pickle (a {"model", "le"} bundle of
+machinelearning_bestAttributes.py keeps its label encoder's classes).
+"""
+
+import sys
+from pathlib import Path
+
+import numpy as np
+
+CHUNK_ROWS = 65536     # rows traversed together per tree; bounds the working arrays
+PAIR_LIMIT = 1 << 20   # up to this many (row, tree) pairs a chunk walks all trees at once
+
+
+# ======================================================
+# EXPORT (needs the fitted sklearn objects)
+# ======================================================
+
+def forest_arrays(model):
+    trees = [est.tree_ for est in model.estimators_]
+    offsets = np.cumsum([0] + [t.node_count for t in trees])
+
+    def children(t, off, side):
+        c = np.asarray(side, dtype=np.int64)
+        return np.where(c >= 0, c + off, -1)
+
+    values = []
+    for t in trees:
+        v = np.asarray(t.value[:, 0, :], dtype=np.float64)
+        sums = v.sum(axis=1)
+        if not np.allclose(sums[sums > 0], 1.0):  # sklearn < 1.4 stored counts, predict_proba normalized them
+            v = v / np.where(sums == 0, 1.0, sums)[:, None]
+        values.append(v)
+
+    return {
+        "kind": np.array("forest"),
+        "roots": offsets[:-1].astype(np.int64),
+        "feature": np.concatenate([t.feature for t in trees]).astype(np.int32),
+        "threshold": np.concatenate([t.threshold for t in trees]).astype(np.float64),
+        "left": np.concatenate([children(t, off, t.children_left) for t, off in zip(trees, offsets)]),
+        "right": np.concatenate([children(t, off, t.children_right) for t, off in zip(trees, offsets)]),
+        "missing_left": np.concatenate([np.asarray(getattr(t, "missing_go_to_left", np.zeros(t.node_count)))
+                                        for t in trees]).astype(bool),
+        "value": np.concatenate(values),
+    }
+
+
+def linear_arrays(model):
+    return {
+        "kind": np.array("linear"),
+        "coef": np.asarray(model.coef_, dtype=np.float64),
+        "intercept": np.asarray(model.intercept_, dtype=np.float64),
+    }
+
+
+def export_model(model, path, labels=None):
+    """Write a fitted RandomForestClassifier or LogisticRegression (and optional label names) to path (.npz)."""
+    if hasattr(model, "estimators_"):
+        arrays = forest_arrays(model)
+    elif hasattr(model, "coef_"):
+        arrays = linear_arrays(model)
+    else:
+        raise TypeError(f"cannot compile {model.__class__.__name__}")
+    arrays["classes"] = np.asarray(model.classes_)
+    arrays["n_features"] = np.array(model.n_features_in_)
+    if labels is not None:
+        arrays["labels"] = np.asarray(labels).astype(str)
+    np.savez(path, **arrays)
+    return Path(path)
+
+
+# ======================================================
+# PREDICTION (NumPy only)
+# ======================================================
+
+class CompiledLabels:
+    """Stand-in for a fitted LabelEncoder: encoded class -> label name."""
+
+    def __init__(self, classes):
+        self.classes_ = classes
+
+    def inverse_transform(self, y):
+        return self.classes_[np.asarray(y, dtype=np.int64)]
+
+
+class CompiledModel:
+    def __init__(self, arrays):
+        self.kind = str(arrays["kind"])
+        self.classes_ = arrays["classes"]
+        self.n_features_in_ = int(arrays["n_features"])
+        self.labels = CompiledLabels(arrays["labels"]) if "labels" in arrays else None
+        self.arrays = arrays
+
+    def predict(self, X):
+        if self.kind == "forest":
+            return self.classes_[self.predict_proba(X).argmax(axis=1)]
+        scores = self.decision_function(X)
+        indices = (scores > 0).astype(np.int64) if scores.ndim == 1 else scores.argmax(axis=1)
+        return self.classes_[indices]
+
+    def decision_function(self, X):
+        a = self.arrays
+        scores = np.asarray(X, dtype=np.float64) @ a["coef"].T + a["intercept"]
+        return scores.reshape(-1) if scores.shape[1] == 1 else scores
+
+    def node_arrays(self):
+        a = self.arrays
+        return tuple(a[k] for k in ("feature", "threshold", "left", "right", "missing_left"))
+
+    def pair_leaves(self, X):
+        """
+        Leaf node (global index) of every row in every tree, shape (rows, trees),
+        walking all (row, tree) pairs at once: few NumPy calls, for small batches.
+        """
+        feature, threshold, left, right, missing_left = self.node_arrays()
+        roots = self.arrays["roots"]
+        node = np.tile(roots, len(X))
+        row = np.repeat(np.arange(len(X)), len(roots))
+
+        active = np.flatnonzero(feature[node] >= 0)
+        while active.size:
+            nd = node[active]
+            x = X[row[active], feature[nd]]
+            go_left = (x <= threshold[nd]) | (np.isnan(x) & missing_left[nd])
+            node[active] = np.where(go_left, left[nd], right[nd])
+            active = active[feature[node[active]] >= 0]
+        return node.reshape(len(X), len(roots))
+
+    def tree_leaves(self, Xf, n, root):
+        """
+        Leaf node (global index) of each of the n rows in the tree rooted at
+        root, for large batches: one tree's nodes stay in cache. Xf is X
+        feature-major and flattened, so x[row, f] = Xf[f * n + row].
+        """
+        feature, threshold, left, right, missing_left = self.node_arrays()
+        node = np.full(n, root, dtype=np.int64)
+        active = np.arange(n) if feature[root] >= 0 else np.arange(0)
+        while active.size:
+            nd = node[active]
+            x = Xf[feature[nd].astype(np.int64) * n + active]
+            go_left = (x <= threshold[nd]) | (np.isnan(x) & missing_left[nd])
+            nxt = np.where(go_left, left[nd], right[nd])
+            node[active] = nxt
+            active = active[feature[nxt] >= 0]
+        return node
+
+    def chunk_leaves(self, X):
+        """Per tree, in tree order, the leaf of every row of a float32 chunk."""
+        roots = self.arrays["roots"]
+        if len(X) * len(roots) <= PAIR_LIMIT:
+            leaves = self.pair_leaves(X)
+            return (leaves[:, t] for t in range(len(roots)))
+        Xf = np.ascontiguousarray(X.T).ravel()
+        return (self.tree_leaves(Xf, len(X), root) for root in roots)
+
+    def apply(self, X):
+        """Leaf node (global index) of every row in every tree, shape (rows, trees)."""
+        X = np.asarray(X, dtype=np.float32)
+        chunks = [np.column_stack(list(self.chunk_leaves(X[start:start + CHUNK_ROWS])))
+                  for start in range(0, len(X), CHUNK_ROWS)]
+        return np.concatenate(chunks) if chunks else np.zeros((0, len(self.arrays["roots"])), dtype=np.int64)
+
+    def linear_proba(self, X):
+        """LogisticRegression.predict_proba: logistic of the decision for two classes, else its softmax."""
+        scores = self.decision_function(X)
+        if scores.ndim == 1:
+            p = np.exp(-np.logaddexp(0.0, -scores))  # 1 / (1 + exp(-s)) without overflow
+            return np.column_stack([1.0 - p, p])
+        e = np.exp(scores - scores.max(axis=1, keepdims=True))
+        return e / e.sum(axis=1, keepdims=True)
+
+    def predict_proba(self, X):
+        if self.kind == "linear":
+            return self.linear_proba(X)
+        value = self.arrays["value"]
+        X = np.asarray(X, dtype=np.float32)
+        out = np.zeros((len(X), value.shape[1]), dtype=np.float64)
+        for start in range(0, len(X), CHUNK_ROWS):
+            acc = out[start:start + CHUNK_ROWS]
+            for leaves in self.chunk_leaves(X[start:start + CHUNK_ROWS]):  # tree order, like the forest's running sum
+                acc += value[leaves]
+        out /= len(self.arrays["roots"])
+        return out
+
+
+def load_compiled(path):
+    with np.load(path, allow_pickle=False) as npz:
+        return CompiledModel({k: npz[k] for k in npz.files})
+
+
+def compiled_path(path):
+    return Path(path).with_suffix(".npz")
+
+
+if __name__ == "__main__":
+    import joblib
+
+    if len(sys.argv) < 2:
+        sys.exit(__doc__)
+    for src in sys.argv[1:]:
+        obj = joblib.load(src)
+        model, labels = (obj["model"], obj["le"].classes_) if isinstance(obj, dict) else (obj, None)
+        out = export_model(model, compiled_path(src), labels)
+        print(f"{src} -> {out} ({model.__class__.__name__})")
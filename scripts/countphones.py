@@ -1,21 +1,13 @@
-import json
+from yelp_loader import load_yelp_business
 
 yelp_path = "../data/raw/yelp_academic_dataset_business.json"
 
-total = 0
-with_phone = 0
+phones = load_yelp_business(yelp_path, ["phone"])["phone"]
 
-with open(yelp_path, "r", encoding="utf-8") as f:
-    for line in f:
-        total += 1
-        try:
-            obj = json.loads(line)
-            if "phone" in obj and obj["phone"].strip():
-                with_phone += 1
-        except:
-            continue
+total = len(phones)  # parsed records: load_yelp_business skips unparseable lines
+with_phone = int(phones.astype(object).map(lambda p: isinstance(p, str) and bool(p.strip())).sum())
 
-print(f"Total records: {total}")
+print(f"Total records (parsed; unparseable lines skipped): {total}")
 print(f"Records with phone: {with_phone}")
-print(f"Percentage with phone: {with_phone / total * 100:.2f}%")
+print(f"Percentage with phone (of parsed records): {with_phone / total * 100:.2f}%")
 
@@ -1,102 +1,217 @@
 #!/usr/bin/env python3
 """
 feature_generator.py
-Generates training and inference feature CSVs for an attribute (name, address, phone...).
+Generates training and inference features for every attribute in ATTRIBUTES
+(name, address, phone, category, website) from one load of the triplet
+matches merged with the ground truth.
 Outputs:
-  ../data/processed/ML_TRAIN_FEATURES_<attr>.csv
-  ../data/processed/ML_INFER_FEATURES_<attr>.csv
+  ../data/processed/ML_TRAIN_FEATURES_<attr>.parquet
+  ../data/processed/ML_INFER_FEATURES_<attr>.parquet
+  (and the same as .csv with --csv)
 
-Currently implements 'name' features. Extend for other attributes similarly.
+The numeric match columns and the category overlaps are shared by all
+attributes and computed once; the per-attribute similarity features and
+labels are built in parallel worker processes.
 """
+import argparse
+import os
+from concurrent.futures import ProcessPoolExecutor
+
 import pandas as pd
 import numpy as np
 from rapidfuzz import fuzz
+from rapidfuzz.process import cpdist
 from pathlib import Path
 
 TRIPLET = "../data/processed/yelp_triplet_matches.csv"
 GROUND_TRUTH = "../data/processed/yelp_ground_truth.csv"
 OUT_DIR = Path("../data/processed")
-OUT_DIR.mkdir(parents=True, exist_ok=True)
-
-def safe_fuzz(a, b):
-    if pd.isna(a) or pd.isna(b):
-        return 0
-    return fuzz.token_set_ratio(str(a), str(b))
-
-def category_overlap(a, b):
-    # inputs: comma-separated strings or lists
-    if pd.isna(a) or pd.isna(b):
-        return 0
-    try:
-        sa = set([x.strip() for x in str(a).split(",") if x.strip()])
-        sb = set([x.strip() for x in str(b).split(",") if x.strip()])
-        if not sa or not sb:
-            return 0
-        return len(sa & sb) / max(1, len(sa | sb))
-    except Exception:
-        return 0
-
-print("Loading data...")
-trip = pd.read_csv(TRIPLET, dtype=str)
-gt = pd.read_csv(GROUND_TRUTH, dtype=str)
-
-# merge ground truth so each candidate row has name_true/address_true
-df = trip.merge(gt, on="place_id", how="left", suffixes=("", "_gt"))
-
-# compute candidate fields (normalize column names you have)
-# Our triplet likely has: name (Yelp), omf_name, overpass_name, omf_score, overpass_score, omf_distance, overpass_distance
-# Fill NaNs for safe numeric operations
-df['omf_score'] = pd.to_numeric(df.get('omf_score'), errors='coerce').fillna(0)
-df['overpass_score'] = pd.to_numeric(df.get('overpass_score'), errors='coerce').fillna(0)
-df['omf_distance'] = pd.to_numeric(df.get('omf_distance'), errors='coerce').fillna(99999)
-df['overpass_distance'] = pd.to_numeric(df.get('overpass_distance'), errors='coerce').fillna(99999)
-
-# FEATURE ENGINEERING for name attribute
-print("Computing features for name...")
-df['yelp_name_sim_to_true'] = df.apply(lambda r: safe_fuzz(r.get('name'), r.get('name_true')), axis=1)
-df['omf_name_sim_to_true'] = df.apply(lambda r: safe_fuzz(r.get('omf_name'), r.get('name_true')), axis=1)
-df['overpass_name_sim_to_true'] = df.apply(lambda r: safe_fuzz(r.get('overpass_name'), r.get('name_true')), axis=1)
-
-# Candidate presence flags
-df['has_omf'] = df['omf_name'].notna().astype(int)
-df['has_overpass'] = df['overpass_name'].notna().astype(int)
-
-# Category overlap between Yelp and OMF/Overpass
-df['cat_overlap_omf'] = df.apply(lambda r: category_overlap(r.get('categories'), r.get('category') or r.get('omf_category')), axis=1)
-df['cat_overlap_overpass'] = df.apply(lambda r: category_overlap(r.get('categories'), r.get('category_right') or r.get('overpass_category')), axis=1)
-
-# Compose feature set
-feature_cols = [
+ROW_GROUP_ROWS = 100_000  # Parquet row groups, the unit ML_infer.py streams
+
+# per attribute: Yelp, OMF and Overpass candidate columns and the ground-truth column
+ATTRIBUTES = {
+    "name":     {"yelp": "name",       "omf": "omf_name",     "overpass": "overpass_name",     "true": "name_true"},
+    "address":  {"yelp": "address",    "omf": "omf_address",  "overpass": "overpass_address",  "true": "address_true"},
+    "phone":    {"yelp": "phone",      "omf": "omf_phone",    "overpass": "overpass_phone",    "true": "phone_true"},
+    "category": {"yelp": "categories", "omf": "omf_category", "overpass": "overpass_category", "true": "category_true"},
+    "website":  {"yelp": "website",    "omf": "omf_website",  "overpass": "overpass_website",  "true": "website_true"},
+}
+SOURCES = ["yelp", "omf", "overpass"]  # label 0 / 1 / 2
+
+SHARED_COLS = [
     'omf_score', 'overpass_score',
     'omf_distance', 'overpass_distance',
-    'yelp_name_sim_to_true','omf_name_sim_to_true','overpass_name_sim_to_true',
-    'has_omf','has_overpass',
-    'cat_overlap_omf','cat_overlap_overpass'
+    'has_omf', 'has_overpass',
+    'cat_overlap_omf', 'cat_overlap_overpass'
 ]
 
-features = df[['place_id','business_id'] + feature_cols + ['omf_name','overpass_name','name','name_true']].copy()
-
-# LABEL creation for training: 0=Yelp,1=OMF,2=Overpass (we only label rows that match truth exactly)
-def label_name_row(r):
-    if pd.notna(r['name_true']) and r.get('name') == r['name_true']:
-        return 0
-    if pd.notna(r['name_true']) and pd.notna(r['omf_name']) and r.get('omf_name') == r['name_true']:
-        return 1
-    if pd.notna(r['name_true']) and pd.notna(r['overpass_name']) and r.get('overpass_name') == r['name_true']:
-        return 2
-    return np.nan  # unknown / no exact match
+SCORER_THREADS = -1  # rapidfuzz threads for the batched scorers (-1 = all cores)
+
+def column(df, col):
+    """A column as an object array (None for NaN); all None when the column does not exist."""
+    if col not in df.columns:
+        return np.full(len(df), None, dtype=object)
+    return df[col].to_numpy(dtype=object, na_value=None)
+
+def batch_fuzz(a, b):
+    """
+    fuzz.token_set_ratio for every (a[i], b[i]) pair in one cpdist call,
+    0 where either side is missing (float column as soon as one pair is scored).
+    """
+    both = pd.notna(a) & pd.notna(b)
+    out = np.zeros(len(a), dtype=np.float64 if both.any() else np.int64)
+    if both.any():
+        out[both] = cpdist([str(x) for x in a[both]], [str(y) for y in b[both]],
+                           scorer=fuzz.token_set_ratio, dtype=np.float64, workers=SCORER_THREADS)
+    return out
+
+def category_ids(values, vocab):
+    """(row, category id) keys of the comma-separated, stripped, non-empty categories of each value."""
+    rows, cats = [], []
+    for i, v in enumerate(values):
+        if v is None:
+            continue
+        for x in str(v).split(","):
+            x = x.strip()
+            if x:
+                rows.append(i)
+                cats.append(vocab.setdefault(x, len(vocab)))
+    return np.array(rows, dtype=np.int64), np.array(cats, dtype=np.int64)
+
+def unique_keys(rows, cats, width):
+    keys = np.sort(rows * width + cats)
+    return keys[np.r_[True, keys[1:] != keys[:-1]]] if len(keys) else keys
 
-features['label'] = features.apply(label_name_row, axis=1)
-
-# TRAIN FEATURES: rows with label not null
-train_df = features[features['label'].notna()].copy()
-train_out = OUT_DIR / "ML_TRAIN_FEATURES_name.csv"
-train_df.to_csv(train_out, index=False)
-print(f"Saved train features: {train_out} ({len(train_df):,} rows)")
-
-# INFER FEATURES: all rows (we keep label if present)
-infer_out = OUT_DIR / "ML_INFER_FEATURES_name.csv"
-features.to_csv(infer_out, index=False)
-print(f"Saved infer features: {infer_out} ({len(features):,} rows)")
-
-print("Feature generation complete.")
+def category_overlap(a, b):
+    """
+    Jaccard overlap of the comma-separated category sets of a[i] and b[i],
+    0 when either set is empty. Categories are integer-encoded and the sets
+    kept as sorted sparse (row, id) keys, so |A & B| is one merge.
+    """
+    n = len(a)
+    vocab = {}
+    ra, ca = category_ids(a, vocab)
+    rb, cb = category_ids(b, vocab)
+    width = max(len(vocab), 1)
+    ka, kb = unique_keys(ra, ca, width), unique_keys(rb, cb, width)
+
+    size_a = np.bincount(ka // width, minlength=n)
+    size_b = np.bincount(kb // width, minlength=n)
+    both = np.sort(np.concatenate([ka, kb]))
+    inter = np.bincount(both[1:][both[1:] == both[:-1]] // width, minlength=n)
+
+    scored = (size_a > 0) & (size_b > 0)
+    out = np.zeros(n, dtype=np.float64 if scored.any() else np.int64)
+    out[scored] = inter[scored] / (size_a + size_b - inter)[scored]
+    return out
+
+def first_present_column(df, *cols):
+    """The first of cols that exists in df (the `r.get(x) or r.get(y)` fallback on a missing column)."""
+    return next((column(df, c) for c in cols if c in df.columns), column(df, cols[-1]))
+
+def attribute_feature_cols(attr):
+    """Feature columns of an attribute, in the order the name features have always had."""
+    return (SHARED_COLS[:4]
+            + [f"{src}_{attr}_sim_to_true" for src in SOURCES]
+            + SHARED_COLS[4:])
+
+def load_merged():
+    """The triplet matches merged with the ground truth, with the shared features computed once."""
+    print("Loading data...")
+    trip = pd.read_csv(TRIPLET, dtype=str)
+    gt = pd.read_csv(GROUND_TRUTH, dtype=str)
+
+    # merge ground truth so each candidate row has name_true/address_true
+    df = trip.merge(gt, on="place_id", how="left", suffixes=("", "_gt"))
+
+    # Fill NaNs for safe numeric operations
+    df['omf_score'] = pd.to_numeric(df.get('omf_score'), errors='coerce').fillna(0)
+    df['overpass_score'] = pd.to_numeric(df.get('overpass_score'), errors='coerce').fillna(0)
+    df['omf_distance'] = pd.to_numeric(df.get('omf_distance'), errors='coerce').fillna(99999)
+    df['overpass_distance'] = pd.to_numeric(df.get('overpass_distance'), errors='coerce').fillna(99999)
+
+    # Candidate presence flags
+    df['has_omf'] = df['omf_name'].notna().astype(int)
+    df['has_overpass'] = df['overpass_name'].notna().astype(int)
+
+    # Category overlap between Yelp and OMF/Overpass
+    yelp_categories = column(df, 'categories')
+    df['cat_overlap_omf'] = category_overlap(yelp_categories, first_present_column(df, 'category', 'omf_category'))
+    df['cat_overlap_overpass'] = category_overlap(yelp_categories, first_present_column(df, 'category_right', 'overpass_category'))
+    return df
+
+def attribute_input(df, attr):
+    """The slice of the merged frame an attribute worker needs; missing candidate columns are all null."""
+    cols = ATTRIBUTES[attr]
+    missing = [c for c in cols.values() if c not in df.columns]
+    if missing:
+        print(f"  {attr}: no {', '.join(missing)} column(s), treated as empty")
+    part = df[['place_id', 'business_id'] + SHARED_COLS].copy()
+    for key in SOURCES + ["true"]:
+        part[cols[key]] = df[cols[key]] if cols[key] in df.columns else None
+    return part
+
+def label_rows(values, true):
+    """0=Yelp, 1=OMF, 2=Overpass for the first candidate equal to the truth; NaN when none is."""
+    has_true = np.array([t is not None for t in true], dtype=bool)
+    conds = [has_true & (v == true) for v in values]
+    return np.select(conds, np.arange(len(values), dtype=np.float64), default=np.nan)
+
+def build_attribute(df, attr, write_csv=False):
+    """Similarity features and labels of one attribute; writes its train/infer files. Returns the row counts."""
+    cols = ATTRIBUTES[attr]
+    true = column(df, cols["true"])
+    values = [column(df, cols[src]) for src in SOURCES]
+
+    for src, val in zip(SOURCES, values):
+        df[f"{src}_{attr}_sim_to_true"] = batch_fuzz(val, true)
+
+    features = df[['place_id', 'business_id'] + attribute_feature_cols(attr)
+                  + [cols["omf"], cols["overpass"], cols["yelp"], cols["true"]]].copy()
+
+    # LABEL creation for training: 0=Yelp,1=OMF,2=Overpass (we only label rows that match truth exactly)
+    features['label'] = label_rows(values, true)
+
+    # TRAIN FEATURES: rows with label not null; INFER FEATURES: all rows (we keep label if present)
+    train_df = features[features['label'].notna()]
+    for kind, out in (("TRAIN", train_df), ("INFER", features)):
+        path = OUT_DIR / f"ML_{kind}_FEATURES_{attr}.parquet"
+        out.to_parquet(path, index=False, row_group_size=ROW_GROUP_ROWS)
+        if write_csv:
+            out.to_csv(path.with_suffix(".csv"), index=False)
+    return len(train_df), len(features)
+
+def init_worker():
+    # the pool already uses every core, keep rapidfuzz single-threaded per worker
+    global SCORER_THREADS
+    SCORER_THREADS = 1
+
+def generate_features(attrs, workers=1, write_csv=False):
+    OUT_DIR.mkdir(parents=True, exist_ok=True)
+    df = load_merged()
+
+    print(f"Computing features for {', '.join(attrs)} ({workers} worker(s))...")
+    parts = [attribute_input(df, attr) for attr in attrs]
+    if workers > 1:
+        with ProcessPoolExecutor(max_workers=workers, initializer=init_worker) as pool:
+            counts = list(pool.map(build_attribute, parts, attrs, [write_csv] * len(attrs)))
+    else:
+        counts = [build_attribute(part, attr, write_csv) for part, attr in zip(parts, attrs)]
+
+    for attr, (n_train, n_infer) in zip(attrs, counts):
+        print(f"  {attr}: {n_train:,} train rows, {n_infer:,} infer rows -> "
+              f"{OUT_DIR}/ML_{{TRAIN,INFER}}_FEATURES_{attr}.parquet")
+    print("Feature generation complete.")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate ML train/infer features for every attribute.")
+    parser.add_argument("--attrs", nargs="+", choices=list(ATTRIBUTES), default=list(ATTRIBUTES),
+                        help="attributes to generate (default: all)")
+    parser.add_argument("--workers", type=int, default=min(len(ATTRIBUTES), os.cpu_count()),
+                        help="worker processes, one attribute at a time (default: one per attribute)")
+    parser.add_argument("--csv", action="store_true",
+                        help="also write the feature files as CSV")
+    args = parser.parse_args()
+
+    generate_features(args.attrs, workers=args.workers, write_csv=args.csv)
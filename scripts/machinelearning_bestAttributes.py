@@ -1,11 +1,13 @@
+import numpy as np
 import pandas as pd
-import os, warnings
+import argparse, hashlib, inspect, json, multiprocessing, os, resource, time, warnings
+from concurrent.futures import ProcessPoolExecutor
+from itertools import chain
 from pathlib import Path
-from sklearn.ensemble import RandomForestClassifier
-from sklearn.linear_model import LogisticRegression
-from sklearn.preprocessing import LabelEncoder
 from joblib import dump, load
 
+from compiled_models import export_model, load_compiled, compiled_path
+
 warnings.filterwarnings("ignore")
 BASE = Path(__file__).resolve().parent.parent
 ATTRS = ["name", "phone", "address", "website", "categories"]
@@ -17,29 +19,120 @@ def clean_src(s):
     s = clean(s)
     return "microsoft" if "msft" in s else "foursquare" if "four" in s else "meta" if "meta" in s else s
 
-def get_features(row, attr, is_train=False):
-    """Builds numerical feature vector for a specific attribute."""
-    f = {}
-    truth = clean(row.get(f"truth_{attr}")) if is_train else None
-    for p in PROVIDERS:
-        val = clean(row.get(f"{p}_{attr}"))
-        f[f"{p}_present"] = 1 if val else 0
-        # Train: overlap with Truth. Inference: length proxy (richness).
-        f[f"{p}_sim"] = len(set(val.split()) & set(truth.split())) if is_train else len(val.split())
-        f[f"{p}_exact"] = 1 if is_train and val == truth else 0
-    return f
+FEATURE_KINDS = ["present", "sim", "exact"]
+FEATURE_NAMES = [f"{p}_{k}" for p in PROVIDERS for k in FEATURE_KINDS]
+
+def clean_column(df, col):
+    """clean() over a whole column as an object array; a missing column is all ""."""
+    if col not in df.columns:
+        return np.full(len(df), "", dtype=object)
+    s = df[col]
+    vals = s.to_numpy(dtype=object, na_value=None)
+    out = np.full(len(s), "", dtype=object)
+    notna = s.notna().to_numpy()
+    out[notna] = [str(x).lower().strip() for x in vals[notna]]
+    return out
+
+def tokenize(columns):
+    """
+    Whitespace tokens of every value of the given equal-length columns, hashed
+    to shared integer ids. Returns one (row, token id) array pair per column
+    and the vocabulary size.
+    """
+    # token lists are split twice (counts, then tokens) rather than kept: millions of
+    # live lists would make the cyclic GC rescan them over and over
+    lens = [np.fromiter(map(len, map(str.split, c)), dtype=np.int64, count=len(c)) for c in columns]
+    flat = np.fromiter(chain.from_iterable(chain.from_iterable(map(str.split, c)) for c in columns),
+                       dtype=object, count=int(sum(l.sum() for l in lens)))
+    ids, vocab = pd.factorize(flat)
+    out, start = [], 0
+    for l in lens:
+        rows = np.repeat(np.arange(len(l)), l)
+        out.append((rows, ids[start:start + len(rows)]))
+        start += len(rows)
+    return out, max(len(vocab), 1)
+
+def sorted_unique(keys):
+    keys = np.sort(keys)
+    return keys[np.r_[True, keys[1:] != keys[:-1]]] if len(keys) else keys
+
+def token_overlap(a, b, n_rows, vocab):
+    """Per row, the number of distinct token ids shared by the (row, id) pairs a and b."""
+    keys = np.sort(np.concatenate([sorted_unique(a[0] * vocab + a[1]), sorted_unique(b[0] * vocab + b[1])]))
+    common = keys[1:][keys[1:] == keys[:-1]]
+    return np.bincount(common // vocab, minlength=n_rows)
+
+def feature_matrices(df, attrs=ATTRS, is_train=False):
+    """
+    Feature matrix (rows x FEATURE_NAMES, float32) per attribute, for all rows
+    of a frame with {provider}_{attr} (and, for training, truth_{attr}) columns:
+      present: the provider has a value
+      sim: train -> distinct tokens shared with the truth, inference -> token count (richness)
+      exact: train -> value equals the truth, inference -> 0
+    All columns of all attributes are cleaned and tokenized in one pass.
+    """
+    n = len(df)
+    cols = [(attr, p) for attr in attrs for p in PROVIDERS + (["truth"] if is_train else [])]
+    values = {key: clean_column(df, f"{key[1]}_{key[0]}") for key in cols}
+    tokens, vocab = tokenize([values[key] for key in cols])
+    tokens = dict(zip(cols, tokens))
+
+    out = {}
+    for attr in attrs:
+        X = np.zeros((n, len(FEATURE_NAMES)), dtype=np.float32)
+        for i, p in enumerate(PROVIDERS):
+            val = values[(attr, p)]
+            X[:, 3 * i] = val != ""
+            if is_train:
+                truth = values[(attr, "truth")]
+                X[:, 3 * i + 1] = token_overlap(tokens[(attr, p)], tokens[(attr, "truth")], n, vocab)
+                X[:, 3 * i + 2] = val == truth
+            else:
+                X[:, 3 * i + 1] = np.bincount(tokens[(attr, p)][0], minlength=n)
+        out[attr] = X
+    return out
+
+def feature_frame(X):
+    """A feature matrix as the DataFrame the models were fitted on (they carry feature_names_in_)."""
+    return pd.DataFrame(X, columns=FEATURE_NAMES)
 
 # --- CORE LOGIC ---
-def train():
-    print("=== Training Models ===")
-    try:
-        df = pd.read_csv("ML_GOLDEN_DATASET.csv")
-    except FileNotFoundError:
-        print("Error: ML_GOLDEN_DATASET_TEMPLATE.csv not found.")
-        return
+GOLDEN = "ML_GOLDEN_DATASET.csv"
+FEATURE_CACHE = Path("models/features")
+CV_FOLDS = 5
 
-    os.makedirs("models", exist_ok=True)
-    
+FEATURE_CODE = [clean, clean_column, tokenize, sorted_unique, token_overlap, feature_matrices]
+
+def feature_code_hash():
+    """Hash of the feature-building code, so editing it invalidates the cache."""
+    code = "".join(inspect.getsource(fn) for fn in FEATURE_CODE) + repr(FEATURE_NAMES)
+    return hashlib.sha256(code.encode("utf-8")).hexdigest()[:16]
+
+def feature_cache_key(path):
+    st = os.stat(path)
+    return {"source": str(Path(path).resolve()), "mtime_ns": st.st_mtime_ns, "size": st.st_size,
+            "code": feature_code_hash()}
+
+def cache_features(golden_path=GOLDEN, cache_dir=FEATURE_CACHE):
+    """
+    Training matrix X (float32) and truth source labels y of every attribute
+    as {attr}_X.npy / {attr}_y.npy in cache_dir, rebuilt only when the golden
+    dataset (mtime + size) or the feature code changed. Returns the attributes
+    that have labels.
+    """
+    key_file = cache_dir / "cache_key.json"
+    key = feature_cache_key(golden_path)
+    if key_file.exists():
+        cached = json.loads(key_file.read_text())
+        if cached["key"] == key:
+            return cached["attrs"]
+
+    print(f"Building feature cache {cache_dir} from {golden_path}...")
+    df = pd.read_csv(golden_path)
+    cache_dir.mkdir(parents=True, exist_ok=True)
+    features = feature_matrices(df, ATTRS, is_train=True)
+
+    attrs = []
     for attr in ATTRS:
         # Check if columns exist before training
         if f"truth_{attr}_source" not in df.columns:
@@ -47,36 +140,152 @@ def train():
             continue
 
         # Filter rows where we actually have a truth source label
-        valid_rows = df[df[f"truth_{attr}_source"].notna() & (df[f"truth_{attr}_source"] != "")]
-        if valid_rows.empty: continue
-            
-        X = pd.DataFrame([get_features(r, attr, True) for _, r in valid_rows.iterrows()])
-        y = valid_rows[f"truth_{attr}_source"].apply(clean).values
-        
-        if len(set(y)) < 2:
-             print(f"  {attr}: Not enough classes to train (needs >1 source type). Skipping.")
-             continue
-
-        le = LabelEncoder()
-        y_enc = le.fit_transform(y)
-        
-        # Competiton: LogReg vs Random Forest
-        models = [LogisticRegression(), RandomForestClassifier(n_estimators=100, random_state=42)]
-        best = max(models, key=lambda m: m.fit(X, y_enc).score(X, y_enc))
-        
-        dump({"model": best, "le": le}, f"models/{attr}_model.joblib")
-        print(f"  {attr}: Trained {best.__class__.__name__}")
+        has_truth = (df[f"truth_{attr}_source"].notna() & (df[f"truth_{attr}_source"] != "")).to_numpy()
+        if not has_truth.any(): continue
+
+        np.save(cache_dir / f"{attr}_X.npy", features[attr][has_truth])
+        np.save(cache_dir / f"{attr}_y.npy", df.loc[has_truth, f"truth_{attr}_source"].apply(clean).to_numpy(dtype=str))
+        attrs.append(attr)
+
+    key_file.write_text(json.dumps({"key": key, "attrs": attrs}))
+    return attrs
+
+def process_peak_rss_mb():
+    """
+    Peak resident set size (MB) of this process or of its largest reaped child
+    (e.g. the CV folds' workers). A high-water mark: it never goes down.
+    """
+    peak = max(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+               resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss)
+    return peak / 1024  # ru_maxrss is in KB on Linux
+
+def measure(fn, *args, **kwargs):
+    """
+    (fn(...), wall-clock seconds, process peak RSS MB after the call). The
+    peak is the process high-water mark (see process_peak_rss_mb), not the
+    call's own footprint: a call after a larger one reports the same value.
+    """
+    t0 = time.perf_counter()
+    result = fn(*args, **kwargs)
+    return result, time.perf_counter() - t0, process_peak_rss_mb()
+
+def train_attribute(attr, cache_dir=FEATURE_CACHE, cv_jobs=1):
+    """
+    Train and save one attribute's model from its cached (memory-mapped) features.
+    Competition: LogReg vs Random Forest by mean cross-validated accuracy
+    (folds in parallel), the winner is refitted on all rows. Returns report lines.
+    """
+    from sklearn.base import clone
+    from sklearn.ensemble import RandomForestClassifier
+    from sklearn.linear_model import LogisticRegression
+    from sklearn.model_selection import cross_val_score
+    from sklearn.preprocessing import LabelEncoder
+
+    X = feature_frame(np.load(cache_dir / f"{attr}_X.npy", mmap_mode="r"))
+    y = np.load(cache_dir / f"{attr}_y.npy")
+    if len(set(y)) < 2:
+        return [f"  {attr}: Not enough classes to train (needs >1 source type). Skipping."]
+
+    le = LabelEncoder()
+    y_enc = le.fit_transform(y)
+
+    # Competiton: LogReg vs Random Forest
+    models = [LogisticRegression(), RandomForestClassifier(n_estimators=100, random_state=42)]
+    folds = min(CV_FOLDS, len(y_enc))
+    report, scores = [], []
+    for m in models:
+        if folds >= 2:
+            cv, secs, peak = measure(cross_val_score, clone(m), X, y_enc, cv=folds, n_jobs=cv_jobs)
+            score = cv.mean()
+        else:  # too few rows to cross-validate: training accuracy, as before
+            fitted, secs, peak = measure(clone(m).fit, X, y_enc)
+            score = fitted.score(X, y_enc)
+        scores.append(score)
+        report.append(f"    {m.__class__.__name__}: score {score:.4f} "
+                      f"({folds}-fold, {secs:.2f}s, process peak RSS {peak:.0f} MB)")
+    best = models[int(np.argmax(scores))]
+    if cv_jobs > 1:  # a pool worker would otherwise wait out loky's idle timeout at exit
+        from joblib.externals.loky import get_reusable_executor
+        get_reusable_executor().shutdown(wait=True)
+
+    _, secs, peak = measure(best.fit, X, y_enc)
+    dump({"model": best, "le": le}, f"models/{attr}_model.joblib")
+    export_model(best, compiled_path(f"models/{attr}_model.joblib"), le.classes_)
+    return [f"  {attr}: Trained {best.__class__.__name__} (fit {secs:.2f}s, process peak RSS {peak:.0f} MB)"] + report
+
+def train(workers=1, cv_jobs=None):
+    # sklearn is only imported by the training workers; inference runs on the compiled models
+    print("=== Training Models ===")
+    if not os.path.exists(GOLDEN):
+        print(f"Error: {GOLDEN} not found.")
+        return
+
+    os.makedirs("models", exist_ok=True)
+    attrs = cache_features()
+    if cv_jobs is None:
+        cv_jobs = max(1, os.cpu_count() // max(1, min(workers, len(attrs))))
+
+    if workers > 1:
+        # spawned, not forked: the CV folds' own worker pool hangs inside a forked child
+        with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn")) as pool:
+            reports = list(pool.map(train_attribute, attrs, [FEATURE_CACHE] * len(attrs), [cv_jobs] * len(attrs)))
+    else:
+        reports = [train_attribute(attr, FEATURE_CACHE, cv_jobs) for attr in attrs]
+    for lines in reports:
+        print("\n".join(lines))
+
+def load_models(model_dir="models"):
+    """
+    {attr: {"model", "le"}} for every attribute with a trained bundle, each
+    loaded once: the compiled NumPy export when there is one, else the
+    joblib bundle (memory-mapped).
+    """
+    models = {}
+    for attr in ATTRS:
+        model_path = os.path.join(model_dir, f"{attr}_model.joblib")
+        if os.path.exists(compiled_path(model_path)):
+            compiled = load_compiled(compiled_path(model_path))
+            models[attr] = {"model": compiled, "le": compiled.labels}
+        elif os.path.exists(model_path):
+            models[attr] = load(model_path, mmap_mode="r")
+    return models
+
+def column_or_empty(wide, col):
+    return wide[col].astype(object).to_numpy() if col in wide.columns else np.full(len(wide), None, dtype=object)
+
+def pick_values(wide, attr, pred_src):
+    """
+    Value of the predicted source for every place; where that is empty, the
+    first non-empty PROVIDERS value (or the empty predicted value when none is).
+    """
+    val = np.full(len(wide), None, dtype=object)
+    for src in np.unique(pred_src):
+        mask = pred_src == src
+        val[mask] = column_or_empty(wide, f"{src}_{attr}")[mask]
+
+    def filled(v):
+        return ~pd.isna(v) & (v != "")
+
+    fallbacks = [column_or_empty(wide, f"{p}_{attr}") for p in PROVIDERS]
+    choices = [val] + fallbacks
+    return np.select([filled(v) for v in choices], choices, default=val)
+
+def majority_source(preds):
+    """
+    Most frequent predicted source per place (preds: places x attributes).
+    Ties go to the source predicted for the earliest attribute.
+    """
+    counts = (preds[:, :, None] == preds[:, None, :]).sum(axis=2)
+    return preds[np.arange(len(preds)), counts.argmax(axis=1)]
 
 def infer():
     print("\n=== Running Inference ===")
     
     # 1. Load and Fix Raw Data
     csv_path = "NORMALIZED_SOURCES.csv"
-    if not csv_path.exists():
-        csv_path = "NORMALIZED_SOURCES.csv" # try local directory
-        if not os.path.exists(csv_path):
-             print(f"Error: {csv_path} not found.")
-             return
+    if not os.path.exists(csv_path):
+        print(f"Error: {csv_path} not found.")
+        return
 
     raw = pd.read_csv(csv_path)
     
@@ -102,39 +311,26 @@ def infer():
     wide.columns = [f"{col[1]}_{col[0]}" for col in wide.columns] 
     wide = wide.reset_index()
 
-    results = []
-    for _, row in wide.iterrows():
-        res = {"place_id": row["place_id"]}
-        votes = []
-        
-        for attr in ATTRS:
-            try:
-                # Load Model & Predict
-                model_path = f"models/{attr}_model.joblib"
-                if not os.path.exists(model_path): continue
-
-                bundle = load(model_path)
-                feats = pd.DataFrame([get_features(row, attr, False)]) # Build features from wide row
-                pred_src = bundle["le"].inverse_transform(bundle["model"].predict(feats))[0]
-                
-                # Pick Value (Fallback to first available if prediction is empty)
-                val = row.get(f"{pred_src}_{attr}")
-                if pd.isna(val) or val == "":
-                    for p in PROVIDERS:
-                        v = row.get(f"{p}_{attr}")
-                        if pd.notna(v) and v != "": val = v; break
-                
-                res[f"best_{attr}"] = val
-                res[f"{attr}_source"] = pred_src
-                votes.append(pred_src)
-            except Exception as e: 
-                # print(f"Error predicting {attr}: {e}")
-                pass
-            
-        if votes: res["best_source"] = max(set(votes), key=votes.count)
-        results.append(res)
-
-    out = pd.DataFrame(results)
+    # 2. One feature matrix and one predict call per attribute
+    models = load_models()
+    features = feature_matrices(wide, list(models), is_train=False)
+    out = pd.DataFrame({"place_id": wide["place_id"]})
+    votes = []
+    for attr, bundle in models.items():
+        try:
+            feats = feature_frame(features[attr])
+            pred_src = bundle["le"].inverse_transform(bundle["model"].predict(feats)).astype(object)
+        except Exception as e:
+            print(f"Error predicting {attr}: {e}")
+            continue
+
+        # Pick Value (Fallback to first available if prediction is empty)
+        out[f"best_{attr}"] = pick_values(wide, attr, pred_src)
+        out[f"{attr}_source"] = pred_src
+        votes.append(pred_src)
+
+    if votes:
+        out["best_source"] = majority_source(np.column_stack(votes))
     
     # --- COMPATIBILITY FIX ---
     # The evaluation script expects 'best_category' (singular), but we generated 'best_categories' (plural).
@@ -150,5 +346,12 @@ def infer():
     print(f"Done. Wrote {len(out)} rows to ML_BEST_ATTRIBUTES.csv")
 
 if __name__ == "__main__":
-    train()
+    parser = argparse.ArgumentParser(description="Train the per-attribute source models, then pick the best attributes.")
+    parser.add_argument("--workers", type=int, default=min(len(ATTRS), os.cpu_count()),
+                        help="worker processes, one attribute at a time (default: one per attribute)")
+    parser.add_argument("--cv-jobs", type=int, default=None,
+                        help="parallel cross-validation folds inside each worker (default: the cores left per worker)")
+    args = parser.parse_args()
+
+    train(workers=args.workers, cv_jobs=args.cv_jobs)
     infer()
@@ -4,25 +4,46 @@ matchingdatasets_fast.py
 
 Optimized matching pipeline:
 - Chunked processing (default 5k Yelp rows / chunk)
-- Spatial nearest join -> local bbox candidate selection -> RapidFuzz on local set
-- Intermediate chunk saves to ../data/interim to be resumable
+- One k-nearest-within-radius pass -> nearest distance + RapidFuzz candidate set
+- Candidate pairs of a chunk are scored in one batched, multithreaded RapidFuzz call
+- Coverage prefilter: Yelp rows far from every target skip the spatial query
+- Optional process pool (--workers N) matching OMF and Overpass chunks concurrently
+- --hilbert: Hilbert-curve ordered chunks, each matched against a clipped local target index
+- --partitioned: grid-cell partitions (targets with a match-radius halo) matched independently from disk;
+  bounds each worker's memory only (inputs and the final merge are still in memory, no checkpoints)
+- Intermediate chunk saves (GeoParquet + manifest) to ../data/interim; reruns skip finished chunks
 """
 
+import argparse
 import math
 import os
 from pathlib import Path
+import numpy as np
 import pandas as pd
 import geopandas as gpd
-from shapely.geometry import Point
+import pyarrow.parquet as pq
+from shapely.geometry import Point, box
 from unidecode import unidecode
 from rapidfuzz import process, fuzz
-from geopandas.tools import sjoin_nearest
 import warnings
 import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import spatial_matching
+from spatial_matching import (
+    nearest_k, score_pairs, best_per_source, cell_assignments, coverage_cells, covered_mask
+)
+from yelp_loader import load_yelp_business
+from chunk_checkpoints import (
+    file_sha256, chunk_file_path, open_manifest, chunk_done, mark_chunk_done, write_chunk, assemble_chunks,
+    restore_row_order
+)
 
 warnings.filterwarnings('ignore', 'GeoSeries.notna', UserWarning)
 
 YELP_JSON = "../data/raw/yelp_academic_dataset_business.json"
+YELP_FIELDS = ["business_id", "name", "address", "city", "state", "postal_code",
+               "latitude", "longitude", "categories"]
 OMF_GEOJSON = "../data/interim/omf_all_merged.geojson"
 OVERPASS_GEOJSON = "../data/interim/overpass_all_merged.geojson"
 OUT_DIR = Path("../data/interim")
@@ -30,13 +51,17 @@ OUT_DIR.mkdir(parents=True, exist_ok=True)
 
 CHUNK_SIZE = 5000
 MAX_DISTANCE_METERS = 1000 #can change this to more lenient
+NEAREST_K = None  # cap on fuzzy candidates per Yelp row (nearest first), None = all within radius
+COVERAGE_CELL_METERS = 10000  # grid cell for the coverage prefilter (raised to MAX_DISTANCE_METERS if smaller)
+PARTITION_CELL_METERS = 50000  # grid cell for --partitioned mode (raised to MAX_DISTANCE_METERS if smaller)
 FUZZY_SCORE_THRESHOLD = 80
 SAVE_EVERY_CHUNK = True
 
 OMF_CHUNK_PREFIX = OUT_DIR / "yelp_omf_chunk"
 OVERPASS_CHUNK_PREFIX = OUT_DIR / "yelp_overpass_chunk"
-FINAL_OMF_OUT = OUT_DIR / "yelp_omf_matched.geojson"
-FINAL_OVERPASS_OUT = OUT_DIR / "yelp_overpass_matched.geojson"
+PARTITION_DIR = OUT_DIR / "partitions"
+FINAL_OMF_OUT = OUT_DIR / "yelp_omf_matched.parquet"
+FINAL_OVERPASS_OUT = OUT_DIR / "yelp_overpass_matched.parquet"
 
 def clean_text(x):
     if pd.isnull(x) or str(x).strip() == "":
@@ -49,60 +74,89 @@ def ensure_cols(gdf, required):
             gdf[c] = None
     return gdf
 
-print("Loading Yelp (CSV/JSON) and target GeoJSONs...")
+def normalize_yelp_batch(df):
+    for col in ["name", "address", "city", "state"]:
+        df[col] = df[col].apply(clean_text)
+    return df
 
-yelp_df = pd.read_json(YELP_JSON, lines=True)
-yelp_df = yelp_df[[
-    "business_id", "name", "address", "city", "state", "postal_code",
-    "latitude", "longitude", "categories"
-]]
+def load_inputs():
+    """Load Yelp + OMF + Overpass and project everything to EPSG:3857."""
+    print("Loading Yelp (CSV/JSON) and target GeoJSONs...")
 
-for col in ["name", "address", "city", "state"]:
-    yelp_df[col] = yelp_df[col].apply(clean_text)
+    yelp_df = load_yelp_business(YELP_JSON, YELP_FIELDS, normalize_yelp_batch)
+    yelp_df = yelp_df.dropna(subset=["latitude", "longitude", "name"]).reset_index(drop=True)
 
-yelp_df = yelp_df.dropna(subset=["latitude", "longitude", "name"]).reset_index(drop=True)
-
-yelp_gdf = gpd.GeoDataFrame(
-    yelp_df,
-    geometry=gpd.points_from_xy(yelp_df.longitude, yelp_df.latitude),
-    crs="EPSG:4326"
-)
+    yelp_gdf = gpd.GeoDataFrame(
+        yelp_df,
+        geometry=gpd.points_from_xy(yelp_df.longitude, yelp_df.latitude),
+        crs="EPSG:4326"
+    )
 
-omf_gdf = gpd.read_file(OMF_GEOJSON)
-overpass_gdf = gpd.read_file(OVERPASS_GEOJSON)
+    omf_gdf = gpd.read_file(OMF_GEOJSON)
+    overpass_gdf = gpd.read_file(OVERPASS_GEOJSON)
 
-omf_gdf = ensure_cols(omf_gdf, ["id", "name", "address", "geometry"])
-overpass_gdf = ensure_cols(overpass_gdf, ["id", "name", "address", "geometry"])
+    omf_gdf = ensure_cols(omf_gdf, ["id", "name", "address", "geometry"])
+    overpass_gdf = ensure_cols(overpass_gdf, ["id", "name", "address", "geometry"])
 
-omf_gdf = omf_gdf.dropna(subset=["geometry"]).reset_index(drop=True)
-overpass_gdf = overpass_gdf.dropna(subset=["geometry"]).reset_index(drop=True)
+    omf_gdf = omf_gdf.dropna(subset=["geometry"]).reset_index(drop=True)
+    overpass_gdf = overpass_gdf.dropna(subset=["geometry"]).reset_index(drop=True)
 
-print(f"Yelp rows: {len(yelp_gdf):,}, OMF rows: {len(omf_gdf):,}, Overpass rows: {len(overpass_gdf):,}")
+    print(f"Yelp rows: {len(yelp_gdf):,}, OMF rows: {len(omf_gdf):,}, Overpass rows: {len(overpass_gdf):,}")
 
-yelp_proj = yelp_gdf.to_crs(epsg=3857).copy()
-omf_proj = omf_gdf.to_crs(epsg=3857).copy()
-overpass_proj = overpass_gdf.to_crs(epsg=3857).copy()
+    yelp_proj = yelp_gdf.to_crs(epsg=3857).copy()
+    omf_proj = omf_gdf.to_crs(epsg=3857).copy()
+    overpass_proj = overpass_gdf.to_crs(epsg=3857).copy()
 
-omf_proj["name_clean"] = omf_proj["name"].apply(clean_text)
-overpass_proj["name_clean"] = overpass_proj["name"].apply(clean_text)
-yelp_proj["name_clean"] = yelp_proj["name"].apply(clean_text)
+    omf_proj["name_clean"] = omf_proj["name"].apply(clean_text)
+    overpass_proj["name_clean"] = overpass_proj["name"].apply(clean_text)
+    yelp_proj["name_clean"] = yelp_proj["name"].apply(clean_text)
 
-omf_index = omf_proj.sindex
-overpass_index = overpass_proj.sindex
+    return yelp_proj, omf_proj, overpass_proj
 
-def process_chunk(yelp_chunk, target_proj, target_index, target_name_col="name_clean"):
+def join_nearest(yelp_chunk, target_proj, src_idx, tgt_idx, dist, distance_col="distance_m"):
+    """
+    Same column layout as sjoin_nearest(how="left"), built from precomputed
+    nearest pairs. One output row per Yelp row, even on equidistant ties.
+    """
+    nearest = np.full(len(yelp_chunk), -1, dtype=np.intp)
+    nearest_dist = np.full(len(yelp_chunk), np.nan)
+    nearest[src_idx] = tgt_idx
+    nearest_dist[src_idx] = dist
+
+    right = pd.DataFrame(target_proj.drop(columns=target_proj.geometry.name))
+    overlap = set(yelp_chunk.columns) & set(right.columns)
+    left = yelp_chunk.rename(columns={c: f"{c}_left" for c in overlap})
+    right = right.rename(columns={c: f"{c}_right" for c in overlap})
+    right.insert(0, "index_right", right.index)
+    right = right.reset_index(drop=True).reindex(nearest)  # -1 -> all-NaN row
+    right.index = left.index
+
+    joined = pd.concat([left, right], axis=1)
+    joined[distance_col] = nearest_dist
+    return gpd.GeoDataFrame(joined, geometry=left.geometry.name, crs=left.crs)
+
+def process_chunk(yelp_chunk, target_proj, target_index, target_name_col="name_clean",
+                  max_distance=MAX_DISTANCE_METERS, k=NEAREST_K, covered=None):
     """
     yelp_chunk: GeoDataFrame in metric CRS (epsg:3857)
     target_proj: target GeoDataFrame in metric CRS
     target_index: spatial index of target_proj
+    max_distance / k: radius and number of nearest targets considered per Yelp row
+    covered: optional bool mask from prefilter_coverage; rows outside it skip the
+             spatial query and come out unmatched
     Returns matched_gdf (yelp_chunk with appended match info)
     """
-    joined = sjoin_nearest(
-        yelp_chunk, target_proj,
-        how="left",
-        max_distance=MAX_DISTANCE_METERS,
-        distance_col="distance_m"
-    )
+    src_geoms = yelp_chunk.geometry.to_numpy()
+    tgt_geoms = target_proj.geometry.to_numpy()
+    query_rows = np.arange(len(yelp_chunk)) if covered is None else np.flatnonzero(covered)
+
+    # single neighbour pass: sorted by (yelp row, distance), so the first pair
+    # of each row is its nearest target
+    pair_src, pair_tgt, pair_dist = nearest_k(src_geoms[query_rows], target_index, tgt_geoms, max_distance, k)
+    pair_src = query_rows[pair_src]
+    _, first = np.unique(pair_src, return_index=True)
+    joined = join_nearest(yelp_chunk, target_proj, pair_src[first], pair_tgt[first], pair_dist[first])
+
     if "name_left" in joined.columns:
         source_name_col = "name_left"
     elif "name" in joined.columns:
@@ -110,115 +164,318 @@ def process_chunk(yelp_chunk, target_proj, target_index, target_name_col="name_c
     else:
         source_name_col = "name_clean"
 
-    matched_candidate_ids = []
-    matched_candidate_names = []
-    matched_scores = []
-    matched_distances = []
-
-    for idx, row in joined.iterrows():
-        src_geom = row.geometry
-        src_name = row[source_name_col] if source_name_col in row else row.get("name_clean")
-        matched_distances.append(row.get("distance_m", None))
-
-        if pd.isnull(src_name) or src_geom is None:
-            matched_candidate_ids.append(None)
-            matched_candidate_names.append(None)
-            matched_scores.append(None)
-            continue
-
-        buf = src_geom.buffer(MAX_DISTANCE_METERS)
-        minx, miny, maxx, maxy = buf.bounds
-
-        candidate_idx = list(target_index.intersection((minx, miny, maxx, maxy)))
-        if not candidate_idx:
-            matched_candidate_ids.append(None)
-            matched_candidate_names.append(None)
-            matched_scores.append(None)
-            continue
-
-        candidates = target_proj.iloc[candidate_idx].copy()
-        candidates["dist2src"] = candidates.geometry.distance(src_geom)
-        candidates = candidates[candidates["dist2src"] <= MAX_DISTANCE_METERS]
-
-        if candidates.empty:
-            matched_candidate_ids.append(None)
-            matched_candidate_names.append(None)
-            matched_scores.append(None)
-            continue
-
-        candidate_names = candidates[target_name_col].fillna("").tolist()
-        res = process.extractOne(src_name, candidate_names, scorer=fuzz.WRatio)
-        match_str, score = (None, None)
-        if res:
-            if isinstance(res, tuple):
-                if len(res) >= 2:
-                    match_str, score = res[0], res[1]
-            else:
-                try:
-                    match_str = res.value
-                    score = res.score
-                except Exception:
-                    match_str, score = None, None
-
-        if score is not None and score >= FUZZY_SCORE_THRESHOLD:
-            cand_row = candidates[candidates[target_name_col] == match_str]
-            if not cand_row.empty:
-                matched_candidate_ids.append(cand_row.iloc[0].get("id"))
-                matched_candidate_names.append(match_str)
-                matched_scores.append(int(score))
-            else:
-                matched_candidate_ids.append(candidates.iloc[0].get("id"))
-                matched_candidate_names.append(match_str)
-                matched_scores.append(int(score))
-        else:
-            matched_candidate_ids.append(None)
-            matched_candidate_names.append(None)
-            matched_scores.append(None)
+    n = len(joined)
+    src_names = joined[source_name_col].to_numpy(dtype=object)
+    tgt_names = target_proj[target_name_col].fillna("").to_numpy(dtype=object)
+    tgt_ids = target_proj["id"].to_numpy(dtype=object)
+
+    keep = ~pd.isnull(src_names[pair_src])
+    pair_src, pair_tgt = pair_src[keep], pair_tgt[keep]
 
-    joined["matched_id"] = matched_candidate_ids
-    joined["matched_name"] = matched_candidate_names
-    joined["matched_name_score"] = matched_scores
-    joined["distance_m_final"] = matched_distances
+    # score all pairs in one call, then keep the best candidate per yelp row
+    scores = score_pairs(src_names, tgt_names, pair_src, pair_tgt)
+    best = best_per_source(pair_src, scores)
+    best = best[scores[best] >= FUZZY_SCORE_THRESHOLD]
+
+    matched_candidate_ids = np.full(n, None, dtype=object)
+    matched_candidate_names = np.full(n, None, dtype=object)
+    matched_scores = np.full(n, None, dtype=object)
+    rows = pair_src[best]
+    matched_candidate_ids[rows] = tgt_ids[pair_tgt[best]]
+    matched_candidate_names[rows] = tgt_names[pair_tgt[best]]
+    matched_scores[rows] = [int(s) for s in scores[best]]
+
+    joined["matched_id"] = matched_candidate_ids.tolist()
+    joined["matched_name"] = matched_candidate_names.tolist()
+    joined["matched_name_score"] = matched_scores.tolist()
+    joined["distance_m_final"] = joined["distance_m"].tolist()
 
     return joined
 
-def run_matching_all_chunks(yelp_proj, target_proj, target_index, chunk_prefix):
-    n = len(yelp_proj)
-    n_chunks = math.ceil(n / CHUNK_SIZE)
-    chunk_files = []
-
-    for i in range(n_chunks):
-        start = i * CHUNK_SIZE
-        end = min((i + 1) * CHUNK_SIZE, n)
-        print(f"\nProcessing chunk {i+1}/{n_chunks}: rows {start}..{end-1} (size {end-start})")
-        yelp_chunk = yelp_proj.iloc[start:end].copy()
-
-        t0 = time.time()
-        matched_chunk = process_chunk(yelp_chunk, target_proj, target_index)
-        t1 = time.time()
-        print(f"Chunk processed in {t1-t0:.1f}s")
-
-        chunk_file = Path(f"{chunk_prefix}_{i+1}.geojson")
-        matched_chunk.to_file(chunk_file, driver="GeoJSON")
-        print(f"Saved chunk to {chunk_file} ({chunk_file.stat().st_size/1024/1024:.2f} MB)")
-        chunk_files.append(chunk_file)
-
-    print("Concatenating chunk files...")
-    gdfs = [gpd.read_file(str(p)) for p in chunk_files]
-    all_matched = gpd.GeoDataFrame(pd.concat(gdfs, ignore_index=True), crs=gdfs[0].crs)
-    # save final
-    return all_matched, chunk_files
+def candidate_scores(yelp_chunk, target_proj, target_index, target_name_col="name_clean",
+                     max_distance=MAX_DISTANCE_METERS, k=NEAREST_K):
+    """
+    The candidate pairs process_chunk picks its match from, before
+    FUZZY_SCORE_THRESHOLD: (pair_src, pair_tgt, pair_dist, scores), positions
+    into yelp_chunk / target_proj sorted by Yelp row, then distance. The best
+    pair of a row within some radius is its best_per_source among the pairs
+    with pair_dist <= radius (threshold_sweep.py).
+    """
+    pair_src, pair_tgt, pair_dist = nearest_k(yelp_chunk.geometry.to_numpy(), target_index,
+                                              target_proj.geometry.to_numpy(), max_distance, k)
+    src_names = yelp_chunk["name"].to_numpy(dtype=object)  # process_chunk's name_left
+    tgt_names = target_proj[target_name_col].fillna("").to_numpy(dtype=object)
+
+    keep = ~pd.isnull(src_names[pair_src])
+    pair_src, pair_tgt, pair_dist = pair_src[keep], pair_tgt[keep], pair_dist[keep]
+    return pair_src, pair_tgt, pair_dist, score_pairs(src_names, tgt_names, pair_src, pair_tgt)
+
+def chunk_ranges(n, chunk_size=CHUNK_SIZE):
+    """(chunk number, start, end) for every chunk of n rows."""
+    return [(i, i * chunk_size, min((i + 1) * chunk_size, n)) for i in range(math.ceil(n / chunk_size))]
+
+def match_params(clip=False):
+    """Parameters recorded in the checkpoint manifest; changing any of them invalidates old chunks."""
+    return {
+        "HILBERT_ORDER": clip,
+        "CHUNK_SIZE": CHUNK_SIZE,
+        "MAX_DISTANCE_METERS": MAX_DISTANCE_METERS,
+        "NEAREST_K": NEAREST_K,
+        "FUZZY_SCORE_THRESHOLD": FUZZY_SCORE_THRESHOLD,
+    }
+
+def prefilter_coverage(yelp_proj, target_proj, label):
+    """
+    Coverage footprint of a target source on a coarse grid; Yelp rows outside
+    it cannot have a candidate within MAX_DISTANCE_METERS. They stay in the
+    output (unmatched) but skip the spatial query. Returns the covered mask.
+    """
+    cell = max(COVERAGE_CELL_METERS, MAX_DISTANCE_METERS)
+    cells = coverage_cells(target_proj.geometry.to_numpy(), cell)
+    covered = covered_mask(yelp_proj.geometry.to_numpy(), cells, cell)
+    pruned = len(covered) - int(covered.sum())
+    print(f"[{label}] coverage prefilter: {len(cells):,} grid cells, "
+          f"pruned {pruned:,}/{len(covered):,} Yelp rows ({pruned / max(1, len(covered)) * 100:.1f}%)")
+    return covered
+
+def spatial_order(yelp_proj):
+    """
+    Yelp rows sorted along a Hilbert curve so consecutive chunks are spatially
+    compact. A yelp_row column keeps the original position; finish_chunks uses
+    it to restore the original order in the final output.
+    """
+    order = np.argsort(yelp_proj.geometry.hilbert_distance().to_numpy(), kind="stable")
+    return yelp_proj.assign(yelp_row=np.arange(len(yelp_proj))).iloc[order]
+
+def clip_targets(yelp_chunk, target_proj, target_index):
+    """Targets inside the chunk bbox grown by MAX_DISTANCE_METERS, in their original order."""
+    minx, miny, maxx, maxy = yelp_chunk.total_bounds
+    idx = target_index.query(box(minx - MAX_DISTANCE_METERS, miny - MAX_DISTANCE_METERS,
+                                 maxx + MAX_DISTANCE_METERS, maxy + MAX_DISTANCE_METERS))
+    local = target_proj.iloc[np.sort(idx)]
+    return local, local.sindex
+
+def match_and_save_chunk(yelp_proj, target_proj, target_index, chunk_prefix, i, start, end, n_chunks,
+                         covered=None, clip=False):
+    """
+    Match one chunk and write it to {chunk_prefix}_{i+1}.parquet. Returns the processing time.
+    clip: match against a local target subset/index (for spatially ordered Yelp rows)
+    """
+    yelp_chunk = yelp_proj.iloc[start:end].copy()
+
+    t0 = time.time()
+    if clip:
+        target_proj, target_index = clip_targets(yelp_chunk, target_proj, target_index)
+    matched_chunk = process_chunk(yelp_chunk, target_proj, target_index,
+                                  covered=None if covered is None else covered[start:end])
+    t1 = time.time()
+
+    chunk_file = chunk_file_path(chunk_prefix, i)
+    write_chunk(matched_chunk, chunk_file)
+    print(f"[{Path(chunk_prefix).name}] chunk {i+1}/{n_chunks}: rows {start}..{end-1} (size {end-start}, "
+          f"{len(target_proj):,} targets) processed in {t1-t0:.1f}s, "
+          f"saved {chunk_file} ({chunk_file.stat().st_size/1024/1024:.2f} MB)",
+          flush=True)
+    return t1 - t0
+
+def pending_chunks(chunk_prefix, n, input_hashes, clip=False):
+    """Open the checkpoint manifest and return (manifest, all ranges, ranges still to match)."""
+    ranges = chunk_ranges(n)
+    manifest = open_manifest(chunk_prefix, ranges, input_hashes, match_params(clip))
+    todo = [r for r in ranges if not chunk_done(manifest, r[0], chunk_prefix)]
+    if len(todo) < len(ranges):
+        print(f"[{Path(chunk_prefix).name}] resuming: {len(ranges) - len(todo)}/{len(ranges)} chunks already done")
+    return manifest, ranges, todo
+
+def finish_chunks(chunk_prefix, ranges, final_out):
+    chunk_files = [chunk_file_path(chunk_prefix, i) for i, _, _ in ranges]
+    print(f"Assembling {len(chunk_files)} chunk files into {final_out}...")
+    assemble_chunks(chunk_files, final_out)
+    if "yelp_row" in pq.read_schema(final_out).names:
+        restore_row_order(final_out, "yelp_row")
+    print(f"Final matches saved to {final_out} ({final_out.stat().st_size/1024/1024:.2f} MB)")
+    return chunk_files
+
+def run_matching_all_chunks(yelp_proj, target_proj, target_index, chunk_prefix, final_out, input_hashes,
+                            clip=False):
+    manifest, ranges, todo = pending_chunks(chunk_prefix, len(yelp_proj), input_hashes, clip)
+    covered = prefilter_coverage(yelp_proj, target_proj, Path(chunk_prefix).name) if todo else None
+    for i, start, end in todo:
+        seconds = match_and_save_chunk(yelp_proj, target_proj, target_index, chunk_prefix, i, start, end,
+                                       len(ranges), covered, clip)
+        mark_chunk_done(manifest, chunk_prefix, i, seconds)
+    return finish_chunks(chunk_prefix, ranges, final_out)
+
+# --------------------------------------------------------------
+# Multi-process executor: each worker gets the Yelp frame and the
+# projected targets (with their sindex) once, then matches chunks.
+# --------------------------------------------------------------
+worker_state = {}
+
+def init_worker(yelp_proj, targets, clip=False):
+    # the pool already uses every core, keep rapidfuzz single-threaded per worker
+    spatial_matching.SCORING_WORKERS = 1
+    worker_state["yelp"] = yelp_proj
+    worker_state["clip"] = clip
+    worker_state["targets"] = {name: (proj, proj.sindex, covered) for name, (proj, covered) in targets.items()}
+
+def chunk_task(name, chunk_prefix, i, start, end, n_chunks):
+    target_proj, target_index, covered = worker_state["targets"][name]
+    return match_and_save_chunk(worker_state["yelp"], target_proj, target_index, chunk_prefix, i, start, end,
+                                n_chunks, covered, worker_state["clip"])
+
+def run_matching_parallel(yelp_proj, targets, workers, clip=False):
+    """
+    targets: {name: (target_proj, chunk_prefix, final_out, input_hashes)}
+    Chunks of every target share one process pool, so OMF and Overpass are
+    matched at the same time. The manifest is updated (by this process only)
+    as each chunk finishes; final files are assembled in chunk order.
+    Returns {name: chunk_files}.
+    """
+    pending = {name: pending_chunks(prefix, len(yelp_proj), hashes, clip)
+               for name, (_, prefix, _, hashes) in targets.items()}
+    target_frames = {name: (proj, prefilter_coverage(yelp_proj, proj, Path(prefix).name))
+                     for name, (proj, prefix, _, _) in targets.items()}
+
+    with ProcessPoolExecutor(max_workers=workers, initializer=init_worker,
+                             initargs=(yelp_proj, target_frames, clip)) as pool:
+        futures = {}
+        for name, (manifest, ranges, todo) in pending.items():
+            prefix = targets[name][1]
+            for i, start, end in todo:
+                fut = pool.submit(chunk_task, name, prefix, i, start, end, len(ranges))
+                futures[fut] = (name, i)
+        for fut in as_completed(futures):
+            name, i = futures[fut]
+            mark_chunk_done(pending[name][0], targets[name][1], i, fut.result())
+
+    return {name: finish_chunks(prefix, pending[name][1], final_out)
+            for name, (_, prefix, final_out, _) in targets.items()}
+
+# --------------------------------------------------------------
+# Partitioned mode: Yelp, OMF and Overpass are bucketed by grid cell
+# (targets replicated into neighbouring cells within the match radius)
+# and written to disk, so each partition is matched on its own.
+# Only the per-worker memory is bounded: the inputs are loaded whole first,
+# the matched partitions are concatenated in memory for the final output,
+# and there is no checkpoint/resume (reruns start from scratch).
+# --------------------------------------------------------------
+def write_groups(frame, rows, keys, all_keys, out_dir):
+    """Write frame.iloc[rows] grouped by key to out_dir/part_<key>.parquet (empty file for keys without rows)."""
+    out_dir.mkdir(parents=True, exist_ok=True)
+    order = np.lexsort((rows, keys))  # original row order inside each partition
+    rows, keys = rows[order], keys[order]
+    starts = np.searchsorted(keys, all_keys, side="left")
+    ends = np.searchsorted(keys, all_keys, side="right")
+    for key, a, b in zip(all_keys, starts, ends):
+        frame.iloc[rows[a:b]].to_parquet(out_dir / f"part_{key}.parquet")
+
+def write_partitions(yelp_proj, targets, part_dir):
+    """
+    Bucket Yelp rows by the grid cell they fall in, and every target into each
+    cell its bbox + MAX_DISTANCE_METERS halo touches, so a partition holds every
+    candidate of its Yelp rows. Yelp rows get a yelp_row column to restore the
+    original order after merging. Returns the partition keys.
+    """
+    cell = max(PARTITION_CELL_METERS, MAX_DISTANCE_METERS)
+    yelp_rows, yelp_keys = cell_assignments(yelp_proj.geometry.to_numpy(), cell)
+    keys = np.unique(yelp_keys)
+    write_groups(yelp_proj.assign(yelp_row=np.arange(len(yelp_proj))), yelp_rows, yelp_keys, keys, part_dir / "yelp")
+
+    for name, target_proj in targets.items():
+        rows, tkeys = cell_assignments(target_proj.geometry.to_numpy(), cell, MAX_DISTANCE_METERS)
+        print(f"[{name}] {len(target_proj):,} rows -> {len(rows):,} partition rows (halo copies included)")
+        write_groups(target_proj, rows, tkeys, keys, part_dir / name)
+
+    print(f"Wrote {len(keys):,} partitions ({cell/1000:.0f} km cells) to {part_dir}")
+    return keys
+
+def init_partition_worker():
+    spatial_matching.SCORING_WORKERS = 1
+
+def partition_task(part_dir, name, key):
+    """Match one partition read from disk; only that partition is held in memory."""
+    t0 = time.time()
+    yelp_part = gpd.read_parquet(part_dir / "yelp" / f"part_{key}.parquet")
+    target_part = gpd.read_parquet(part_dir / name / f"part_{key}.parquet")
+    matched = process_chunk(yelp_part, target_part, target_part.sindex)
+
+    out_file = part_dir / f"{name}_matched" / f"part_{key}.parquet"
+    out_file.parent.mkdir(parents=True, exist_ok=True)
+    write_chunk(matched, out_file)
+    print(f"[{name}] partition {key}: {len(yelp_part):,} Yelp x {len(target_part):,} targets "
+          f"processed in {time.time()-t0:.1f}s", flush=True)
+    return out_file
+
+def run_matching_partitioned(yelp_proj, targets, workers=1, part_dir=None):
+    """
+    targets: {name: (target_proj, final_out)}
+    Produces the same rows as the single-frame process_chunk path, in the
+    original Yelp order. Each worker holds one partition; the merge holds all
+    matched rows of a target at once. Returns {name: final_out}.
+    """
+    part_dir = Path(part_dir or PARTITION_DIR)
+    keys = write_partitions(yelp_proj, {name: proj for name, (proj, _) in targets.items()}, part_dir)
+    tasks = [(name, key) for name in targets for key in keys]
+
+    if workers > 1:
+        with ProcessPoolExecutor(max_workers=workers, initializer=init_partition_worker) as pool:
+            files = list(pool.map(partition_task, [part_dir] * len(tasks), *zip(*tasks)))
+    else:
+        files = [partition_task(part_dir, name, key) for name, key in tasks]
+
+    results = {}
+    for name, (_, final_out) in targets.items():
+        parts = [gpd.read_parquet(f) for (n, _), f in zip(tasks, files) if n == name]
+        merged = pd.concat(parts, ignore_index=True).sort_values("yelp_row", kind="stable")
+        merged = merged.drop(columns="yelp_row").reset_index(drop=True)
+        gpd.GeoDataFrame(merged, geometry=parts[0].geometry.name, crs=parts[0].crs).to_parquet(final_out, index=False)
+        print(f"Final matches saved to {final_out} ({final_out.stat().st_size/1024/1024:.2f} MB)")
+        results[name] = final_out
+    return results
 
 if __name__ == "__main__":
-    print("\n=== MATCHING: Yelp -> OMF ===")
-    omf_matched_gdf, omf_chunks = run_matching_all_chunks(yelp_proj, omf_proj, omf_index, OMF_CHUNK_PREFIX)
-    omf_matched_gdf.to_file(FINAL_OMF_OUT, driver="GeoJSON")
-    print(f"Final OMF matched saved to {FINAL_OMF_OUT} ({FINAL_OMF_OUT.stat().st_size/1024/1024:.2f} MB)")
+    parser = argparse.ArgumentParser(description="Match Yelp businesses to OMF and Overpass places.")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="worker processes for chunk matching (1 = sequential, OMF then Overpass)")
+    parser.add_argument("--partitioned", action="store_true",
+                        help="match grid-cell partitions written to disk instead of chunks of the full frame; "
+                             "bounds per-worker memory only: inputs are loaded and the results merged in "
+                             "memory, and there is no checkpoint/resume")
+    parser.add_argument("--hilbert", action="store_true",
+                        help="chunk Yelp rows in Hilbert-curve order, each chunk against a clipped target index")
+    args = parser.parse_args()
+
+    yelp_proj, omf_proj, overpass_proj = load_inputs()
+
+    if args.partitioned:
+        print(f"\n=== MATCHING: Yelp -> OMF + Overpass (partitioned, {args.workers} workers) ===")
+        run_matching_partitioned(yelp_proj, {
+            "omf": (omf_proj, FINAL_OMF_OUT),
+            "overpass": (overpass_proj, FINAL_OVERPASS_OUT),
+        }, args.workers)
+    else:
+        print("Hashing inputs for the checkpoint manifest...")
+        yelp_hash = file_sha256(YELP_JSON)
+        omf_hashes = {YELP_JSON: yelp_hash, OMF_GEOJSON: file_sha256(OMF_GEOJSON)}
+        overpass_hashes = {YELP_JSON: yelp_hash, OVERPASS_GEOJSON: file_sha256(OVERPASS_GEOJSON)}
+
+        if args.hilbert:
+            yelp_proj = spatial_order(yelp_proj)
+
+        if args.workers > 1:
+            print(f"\n=== MATCHING: Yelp -> OMF + Overpass ({args.workers} workers) ===")
+            run_matching_parallel(yelp_proj, {
+                "omf": (omf_proj, OMF_CHUNK_PREFIX, FINAL_OMF_OUT, omf_hashes),
+                "overpass": (overpass_proj, OVERPASS_CHUNK_PREFIX, FINAL_OVERPASS_OUT, overpass_hashes),
+            }, args.workers, args.hilbert)
+        else:
+            print("\n=== MATCHING: Yelp -> OMF ===")
+            run_matching_all_chunks(yelp_proj, omf_proj, omf_proj.sindex, OMF_CHUNK_PREFIX,
+                                    FINAL_OMF_OUT, omf_hashes, args.hilbert)
 
-    print("\n=== MATCHING: Yelp -> Overpass ===")
-    overpass_matched_gdf, overpass_chunks = run_matching_all_chunks(yelp_proj, overpass_proj, overpass_index, OVERPASS_CHUNK_PREFIX)
-    overpass_matched_gdf.to_file(FINAL_OVERPASS_OUT, driver="GeoJSON")
-    print(f"Final Overpass matched saved to {FINAL_OVERPASS_OUT} ({FINAL_OVERPASS_OUT.stat().st_size/1024/1024:.2f} MB)")
+            print("\n=== MATCHING: Yelp -> Overpass ===")
+            run_matching_all_chunks(yelp_proj, overpass_proj, overpass_proj.sindex, OVERPASS_CHUNK_PREFIX,
+                                    FINAL_OVERPASS_OUT, overpass_hashes, args.hilbert)
 
     print("\nAll matching complete.")
-
@@ -3,19 +3,19 @@ import pandas as pd
 import numpy as np
 from unidecode import unidecode
 
+from yelp_loader import load_yelp_business
+
 def clean_text(x):
     if pd.isnull(x) or str(x).strip() == "":
         return np.nan
     return unidecode(str(x).strip().lower())
 
 def normalize_yelp_json(input_file):
-    df = pd.read_json(input_file, lines=True)
-
     key_fields = [
         "business_id", "name", "address", "city", "state",
         "postal_code", "latitude", "longitude","categories"
     ]
-    df = df[key_fields]
+    df = load_yelp_business(input_file, key_fields)
 
     text_columns = ["name", "address", "city", "state"]
     for col in text_columns:
@@ -1,33 +1,62 @@
+import argparse
 import csv
+import io
 import json
+import os
+import shutil
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import pyarrow as pa
+import pyarrow.parquet as pq
 
 
 
 INPUT = "../data/raw/OMF_ALL_COMBINED.csv"
 INPUT = "project_b_samples_2k.csv"
-OUTPUT = "NORMALIZED_SOURCES.csv"
+OUTPUT = "NORMALIZED_SOURCES.csv"              # legacy JSON-text CSV (skipped with --no-csv)
+OUTPUT_PARQUET = "NORMALIZED_SOURCES.parquet"
+CHUNK_BYTES = 64 << 20                         # size of the byte ranges handed to the workers
 
 # --------------------------------------------
-# PARSING STATISTICS
+# OUTPUT SCHEMA
 # --------------------------------------------
-parse_attempts = 0
-parse_failures = 0
-total_raw_records = 0
-normalized_records = 0
+CSV_HEADER = [
+    "place_id", "source", "record_id", "update_time", "name",
+    "categories", "phone", "website", "socials", "address", "confidence"
+]
+
+ADDRESS_FIELDS = ["freeform", "locality", "postcode", "region", "country"]
+JSON_COLUMNS = ["categories", "phone", "website", "socials", "address"]
+
+# typed columns, plus each JSON column's text exactly as the CSV holds it (<col>_json)
+SCHEMA = pa.schema([
+    ("place_id", pa.string()),
+    ("source", pa.string()),
+    ("record_id", pa.string()),
+    ("update_time", pa.string()),
+    ("name", pa.string()),
+    ("categories", pa.struct([("primary", pa.string()), ("alternate", pa.list_(pa.string()))])),
+    ("phone", pa.list_(pa.string())),
+    ("website", pa.list_(pa.string())),
+    ("socials", pa.list_(pa.string())),
+    ("address", pa.list_(pa.struct([(k, pa.string()) for k in ADDRESS_FIELDS]))),
+    ("confidence", pa.float64()),
+] + [(f"{col}_json", pa.string()) for col in JSON_COLUMNS])
 
 # --------------------------------------------
 # HELPERS
 # --------------------------------------------
-def safe_json(val):
-    """Safe JSON loader that tracks parsing attempts & failures."""
-    global parse_attempts, parse_failures
+def safe_json(val, stats):
+    """Safe JSON loader that tracks parsing attempts & failures in stats."""
     if not val or val.strip() == "":
         return None
-    parse_attempts += 1
+    stats["parse_attempts"] += 1
     try:
         return json.loads(val)
     except Exception:
-        parse_failures += 1
+        stats["parse_failures"] += 1
         return None
 
 def stringify(x):
@@ -36,119 +65,268 @@ def stringify(x):
         return ""
     return f"=\"{str(x)}\""
 
+def as_text(x):
+    return None if x is None or x == "" else str(x)
+
+def as_float(x):
+    try:
+        return float(x)
+    except (TypeError, ValueError):
+        return None
+
+def as_text_list(x):
+    """Parsed JSON list -> list of strings; empty / non-list values become null (the CSV wrote "")."""
+    if not x or not isinstance(x, list):
+        return None
+    return [str(v) for v in x if v is not None]
+
+def as_categories(x):
+    if not x or not isinstance(x, dict):
+        return None
+    return {"primary": as_text(x.get("primary")), "alternate": as_text_list(x.get("alternate"))}
+
+def as_addresses(x):
+    if not x or not isinstance(x, list):
+        return None
+    return [{k: as_text(a.get(k)) for k in ADDRESS_FIELDS} for a in x if isinstance(a, dict)]
+
+def json_text(x):
+    """A parsed JSON value as the CSV writes it ("" when empty)."""
+    return json.dumps(x) if x else ""
+
+def typed_record(rec):
+    """An output record (parsed JSON values) in the Parquet SCHEMA types."""
+    return {
+        "place_id": as_text(rec["place_id"]),
+        "source": as_text(rec["source"]),
+        "record_id": as_text(rec["record_id"]),
+        "update_time": as_text(rec["update_time"]),
+        "name": as_text(rec["name"]),
+        "categories": as_categories(rec["categories"]),
+        "phone": as_text_list(rec["phone"]),
+        "website": as_text_list(rec["website"]),
+        "socials": as_text_list(rec["socials"]),
+        "address": as_addresses(rec["address"]),
+        "confidence": as_float(rec["confidence"]),
+        **{f"{col}_json": json_text(rec[col]) for col in JSON_COLUMNS},
+    }
+
+def csv_row(rec):
+    """An output record as the legacy NORMALIZED_SOURCES.csv row (JSON text columns)."""
+    return [
+        rec["place_id"],
+        rec["source"],
+        stringify(rec["record_id"]),
+        rec["update_time"],
+        rec["name"],
+        *[json_text(rec[col]) for col in JSON_COLUMNS],
+        rec["confidence"]
+    ]
+
+# --------------------------------------------
+# NORMALIZATION OF ONE OMF ROW
+# --------------------------------------------
+def normalize_row(row, stats):
+    """One output record per dataset in "sources", one for the base_* data, or a missing_all_data row."""
+    records = []
+    place_id = row["id"]
+
+    # Extract fields
+    sources = safe_json(row["sources"], stats)
+    name = safe_json(row["names"], stats)
+    cat = safe_json(row["categories"], stats)
+    web = safe_json(row["websites"], stats)
+    socials = safe_json(row["socials"], stats)
+    phone = safe_json(row["phones"], stats)
+    addr = safe_json(row["addresses"], stats)
+    conf = row["confidence"]
+
+    # =====================================================
+    # UNIVERSAL HANDLER FOR ALL DATASETS IN "sources"
+    # =====================================================
+    if isinstance(sources, list):
+        for item in sources:
+            records.append({
+                "place_id": place_id,
+                "source": item.get("dataset", "").lower(),
+                "record_id": item.get("record_id"),
+                "update_time": item.get("update_time", ""),
+                "name": name.get("primary") if isinstance(name, dict) else "",
+                "categories": cat, "phone": phone, "website": web, "socials": socials, "address": addr,
+                "confidence": item.get("confidence", conf),
+            })
+
+    # =====================================================
+    # UNIVERSAL HANDLER FOR STRUCTURED DATA (base_*)
+    # =====================================================
+    struct_sources = safe_json(row["base_sources"], stats)
+    struct_name = safe_json(row["base_names"], stats)
+    struct_cat = safe_json(row["base_categories"], stats)
+    struct_web = safe_json(row["base_websites"], stats)
+    struct_socials = safe_json(row["base_socials"], stats)
+    struct_phone = safe_json(row["base_phones"], stats)
+    struct_addr = safe_json(row["base_addresses"], stats)
+    struct_conf = row["base_confidence"]
+
+    if isinstance(struct_sources, list) and len(struct_sources) > 0:
+        struct = struct_sources[0]
+        dataset = struct.get("dataset", "structured").lower()
+        records.append({
+            "place_id": place_id,
+            "source": f"{dataset}_structured",
+            "record_id": struct.get("record_id"),
+            "update_time": struct.get("update_time", ""),
+            "name": struct_name.get("primary") if isinstance(struct_name, dict) else "",
+            "categories": struct_cat, "phone": struct_phone, "website": struct_web,
+            "socials": struct_socials, "address": struct_addr,
+            "confidence": struct_conf,
+        })
+
+    # =====================================================
+    # ENSURE COVERAGE
+    # =====================================================
+    if not records:
+        records.append({
+            "place_id": place_id, "source": "missing_all_data", "record_id": None, "update_time": "",
+            "name": "", "categories": None, "phone": None, "website": None, "socials": None,
+            "address": None, "confidence": "",
+        })
+    return records
+
+# --------------------------------------------
+# BYTE-RANGE CHUNKS
+# --------------------------------------------
+def read_header(path):
+    with open(path, "rb") as f:
+        line = f.readline()
+    return next(csv.reader([line.decode("utf-8")])), len(line)
+
+def chunk_ranges(path, chunk_bytes=CHUNK_BYTES):
+    """
+    (start, end) byte ranges of about chunk_bytes covering every CSV record
+    after the header. A range only ends after a newline that is outside
+    quotes (even number of '"' since the range start), so quoted fields may
+    contain newlines.
+    """
+    _, start = read_header(path)
+    size = os.path.getsize(path)
+    ranges = []
+    with open(path, "rb") as f:
+        while start < size:
+            target = start + chunk_bytes
+            if target >= size:
+                ranges.append((start, size))
+                break
+            f.seek(start)
+            parity = f.read(target - start).count(b'"') % 2
+            end = target
+            for line in iter(f.readline, b""):
+                parity = (parity + line.count(b'"')) % 2
+                end += len(line)
+                if parity == 0 and line.endswith(b"\n"):
+                    break
+            ranges.append((start, end))
+            start = end
+    return ranges
+
+def part_path(part_dir, i, ext):
+    return Path(part_dir) / f"part-{i:05d}.{ext}"
+
+def normalize_range(path, header, i, start, end, part_dir, write_csv=False):
+    """Normalize the CSV records in [start, end) into Parquet (and CSV) part files. Returns the stats."""
+    stats = Counter()
+    with open(path, "rb") as f:
+        f.seek(start)
+        text = f.read(end - start).decode("utf-8")
+
+    records = []
+    for row in csv.DictReader(io.StringIO(text, newline=""), fieldnames=header):
+        stats["total_raw_records"] += 1
+        records.extend(normalize_row(row, stats))
+        stats["normalized_records"] += 1
+
+    pq.write_table(pa.Table.from_pylist([typed_record(r) for r in records], schema=SCHEMA),
+                   part_path(part_dir, i, "parquet"))
+    if write_csv:
+        with open(part_path(part_dir, i, "csv"), "w", newline="", encoding="utf-8") as fout:
+            csv.writer(fout).writerows(csv_row(r) for r in records)
+    return stats
+
+def assemble_parts(part_dir, n_parts, write_csv=False):
+    """Concatenate the part files, in range order, into OUTPUT_PARQUET (and OUTPUT)."""
+    tmp = Path(f"{OUTPUT_PARQUET}.tmp")
+    with pq.ParquetWriter(tmp, SCHEMA) as writer:
+        for i in range(n_parts):
+            writer.write_table(pq.read_table(part_path(part_dir, i, "parquet")))
+    os.replace(tmp, OUTPUT_PARQUET)
+
+    if write_csv:
+        with open(OUTPUT, "w", newline="", encoding="utf-8") as fout:
+            csv.writer(fout).writerow(CSV_HEADER)
+            for i in range(n_parts):
+                with open(part_path(part_dir, i, "csv"), encoding="utf-8", newline="") as fin:
+                    shutil.copyfileobj(fin, fout)
+
 # --------------------------------------------
 # MAIN NORMALIZATION PROCESS
 # --------------------------------------------
-with open(INPUT, encoding="utf-8") as fin, open(OUTPUT, "w", newline="", encoding="utf-8") as fout:
-    reader = csv.DictReader(fin)
-    writer = csv.writer(fout)
-
-    # Output schema
-    writer.writerow([
-        "place_id", "source", "record_id", "update_time", "name",
-        "categories", "phone", "website", "socials", "address", "confidence"
-    ])
-
-    # ----------------------------------------
-    # PROCESS EACH OMF ROW
-    # ----------------------------------------
-    for row in reader:
-        total_raw_records += 1
-        rows_written_for_this_place = 0
-
-        place_id = row["id"]
-
-        # Extract fields
-        sources = safe_json(row["sources"])
-        name = safe_json(row["names"])
-        cat = safe_json(row["categories"])
-        web = safe_json(row["websites"])
-        socials = safe_json(row["socials"])
-        phone = safe_json(row["phones"])
-        addr = safe_json(row["addresses"])
-        conf = row["confidence"]
-
-        # =====================================================
-        # UNIVERSAL HANDLER FOR ALL DATASETS IN "sources"
-        # =====================================================
-        if isinstance(sources, list):
-            for item in sources:
-                dataset = item.get("dataset", "").lower()
-                writer.writerow([
-                    place_id,
-                    dataset,
-                    stringify(item.get("record_id")),
-                    item.get("update_time", ""),
-                    name.get("primary") if isinstance(name, dict) else "",
-                    json.dumps(cat) if cat else "",
-                    json.dumps(phone) if phone else "",
-                    json.dumps(web) if web else "",
-                    json.dumps(socials) if socials else "",
-                    json.dumps(addr) if addr else "",
-                    item.get("confidence", conf)
-                ])
-                rows_written_for_this_place += 1
-
-        # =====================================================
-        # UNIVERSAL HANDLER FOR STRUCTURED DATA (base_*)
-        # =====================================================
-        struct_sources = safe_json(row["base_sources"])
-        struct_name = safe_json(row["base_names"])
-        struct_cat = safe_json(row["base_categories"])
-        struct_web = safe_json(row["base_websites"])
-        struct_socials = safe_json(row["base_socials"])
-        struct_phone = safe_json(row["base_phones"])
-        struct_addr = safe_json(row["base_addresses"])
-        struct_conf = row["base_confidence"]
-
-        if isinstance(struct_sources, list) and len(struct_sources) > 0:
-            struct = struct_sources[0]
-            dataset = struct.get("dataset", "structured").lower()
-            writer.writerow([
-                place_id,
-                f"{dataset}_structured",
-                stringify(struct.get("record_id")),
-                struct.get("update_time", ""),
-                struct_name.get("primary") if isinstance(struct_name, dict) else "",
-                json.dumps(struct_cat) if struct_cat else "",
-                json.dumps(struct_phone) if struct_phone else "",
-                json.dumps(struct_web) if struct_web else "",
-                json.dumps(struct_socials) if struct_socials else "",
-                json.dumps(struct_addr) if struct_addr else "",
-                struct_conf
-            ])
-            rows_written_for_this_place += 1
-
-        # =====================================================
-        # ENSURE COVERAGE
-        # =====================================================
-        if rows_written_for_this_place == 0:
-            writer.writerow([
-                place_id, "missing_all_data", "", "", "", "", "", "", "", "", ""
-            ])
-
-        normalized_records += 1
+def normalize_omf(path, workers=1, write_csv=True, chunk_bytes=CHUNK_BYTES):
+    header, _ = read_header(path)
+    ranges = chunk_ranges(path, chunk_bytes)
+    part_dir = Path(f"{OUTPUT_PARQUET}.parts")
+    shutil.rmtree(part_dir, ignore_errors=True)
+    part_dir.mkdir()
+
+    print(f"Normalizing {path}: {len(ranges)} chunk(s), {workers} worker(s)")
+    args = [(path, header, i, start, end, part_dir, write_csv) for i, (start, end) in enumerate(ranges)]
+    if workers > 1:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            results = list(pool.map(normalize_range, *zip(*args)))
+    else:
+        results = [normalize_range(*a) for a in args]
+
+    assemble_parts(part_dir, len(ranges), write_csv)
+    shutil.rmtree(part_dir)
+    print(f"Wrote {OUTPUT_PARQUET}" + (f" and {OUTPUT}" if write_csv else ""))
+    return sum(results, Counter())
 
 # --------------------------------------------
 # PRINT SUMMARY
 # --------------------------------------------
-coverage = (normalized_records / total_raw_records) * 100
-error_rate = (parse_failures / parse_attempts * 100) if parse_attempts else 0
-
-print("=== NORMALIZATION STATS ===")
-print("Input OMF records:", total_raw_records)
-print("Normalized records produced:", normalized_records)
-print(f"Normalization coverage: {coverage:.2f}%")
-print()
-
-print("=== PARSING STATS ===")
-print("Total parse attempts:", parse_attempts)
-print("Total parse failures:", parse_failures)
-print(f"Parsing error rate: {error_rate:.2f}%")
-print()
-
-if error_rate < 1.0:
-    print("Parsing error rate acceptable (<1%)")
-else:
-    print("WARNING: High parsing error rate!")
+def print_summary(stats):
+    total_raw_records = stats["total_raw_records"]
+    normalized_records = stats["normalized_records"]
+    parse_attempts = stats["parse_attempts"]
+    parse_failures = stats["parse_failures"]
+
+    coverage = (normalized_records / total_raw_records) * 100
+    error_rate = (parse_failures / parse_attempts * 100) if parse_attempts else 0
+
+    print("=== NORMALIZATION STATS ===")
+    print("Input OMF records:", total_raw_records)
+    print("Normalized records produced:", normalized_records)
+    print(f"Normalization coverage: {coverage:.2f}%")
+    print()
+
+    print("=== PARSING STATS ===")
+    print("Total parse attempts:", parse_attempts)
+    print("Total parse failures:", parse_failures)
+    print(f"Parsing error rate: {error_rate:.2f}%")
+    print()
+
+    if error_rate < 1.0:
+        print("Parsing error rate acceptable (<1%)")
+    else:
+        print("WARNING: High parsing error rate!")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Normalize the combined OMF CSV into one row per source record.")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(),
+                        help="worker processes, one byte-range chunk at a time (default: all cores)")
+    # machinelearning_bestAttributes.infer and sample_OMF_all.py still read the CSV
+    parser.add_argument("--no-csv", dest="csv", action="store_false",
+                        help=f"skip the legacy JSON-text {OUTPUT} (only once no script reads it)")
+    args = parser.parse_args()
 
+    print_summary(normalize_omf(INPUT, workers=args.workers, write_csv=args.csv))
@@ -0,0 +1,139 @@
+"""
+normalized_sources.py
+
+Typed loader for NORMALIZED_SOURCES (one row per OMF source record).
+normalize_omf.py writes NORMALIZED_SOURCES.parquet with native list/struct
+columns. The legacy JSON-text CSV is parsed once into the same schema and
+cached as Parquet in CACHE_DIR (keyed by the CSV's path, mtime and size), so the
+downstream stages never call json.loads on these columns themselves. Both
+also carry every JSON column's original text (<col>_json), byte for byte as
+the CSV holds it, for outputs that pass it through.
+"""
+
+import hashlib
+import json
+import os
+from pathlib import Path
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+
+from normalize_omf import (SCHEMA, ADDRESS_FIELDS, JSON_COLUMNS, as_text, as_float, as_text_list,
+                           as_categories, as_addresses)
+
+SOURCES_PARQUET = "NORMALIZED_SOURCES.parquet"
+SOURCES_CSV = "NORMALIZED_SOURCES.csv"
+CACHE_DIR = Path("../data/interim/normalized_sources_cache")
+
+LIST_COLUMNS = JSON_COLUMNS
+RAW_JSON_COLUMNS = [f"{col}_json" for col in LIST_COLUMNS]
+
+
+def default_sources_path():
+    """NORMALIZED_SOURCES.parquet when normalize_omf.py has written it, else the legacy CSV."""
+    return SOURCES_PARQUET if os.path.exists(SOURCES_PARQUET) else SOURCES_CSV
+
+
+def parse_json(val):
+    if not val:
+        return None
+    try:
+        return json.loads(val)
+    except ValueError:
+        return None
+
+
+def csv_to_table(path):
+    """Parse the JSON-text columns of a NORMALIZED_SOURCES CSV into a SCHEMA table."""
+    df = pd.read_csv(path, dtype=str, keep_default_na=False)
+    df = df.rename(columns={"addr": "address"})  # older CSVs name the address column "addr"
+
+    records = []
+    for r in df.to_dict("records"):
+        record_id = r.get("record_id", "")
+        if record_id.startswith('="') and record_id.endswith('"'):  # normalize_omf's Excel guard
+            record_id = record_id[2:-1]
+        records.append({
+            "place_id": as_text(r.get("place_id")),
+            "source": as_text(r.get("source")),
+            "record_id": as_text(record_id),
+            "update_time": as_text(r.get("update_time")),
+            "name": as_text(r.get("name")),
+            "categories": as_categories(parse_json(r.get("categories"))),
+            "phone": as_text_list(parse_json(r.get("phone"))),
+            "website": as_text_list(parse_json(r.get("website"))),
+            "socials": as_text_list(parse_json(r.get("socials"))),
+            "address": as_addresses(parse_json(r.get("address"))),
+            "confidence": as_float(r.get("confidence")),
+            **{f"{col}_json": r.get(col, "") for col in LIST_COLUMNS},  # the CSV's text, verbatim
+        })
+    return pa.Table.from_pylist(records, schema=SCHEMA)
+
+
+def read_sources_table(path):
+    """SCHEMA table for a Parquet file, or for a CSV through its Parquet cache."""
+    if str(path).endswith(".parquet"):
+        return pq.read_table(path)
+
+    source = str(Path(path).resolve())
+    cache = CACHE_DIR / f"{Path(path).stem}_{hashlib.sha1(source.encode('utf-8')).hexdigest()[:12]}.parquet"
+    st = os.stat(path)
+    key = json.dumps({"source": source, "mtime_ns": st.st_mtime_ns, "size": st.st_size}).encode("utf-8")
+    if cache.exists():
+        schema = pq.read_schema(cache)
+        if (schema.metadata or {}).get(b"source_csv") == key and schema.remove_metadata().equals(SCHEMA):
+            return pq.read_table(cache)
+
+    print(f"Parsing {path} (cached as {cache})...")
+    table = csv_to_table(path)
+    table = table.replace_schema_metadata({b"source_csv": key})
+    CACHE_DIR.mkdir(parents=True, exist_ok=True)
+    tmp = Path(f"{cache}.tmp")
+    pq.write_table(table, tmp)
+    os.replace(tmp, cache)
+    return table
+
+
+def first_address_parts(table):
+    """One column per ADDRESS_FIELDS entry, taken from the first address of every row."""
+    addresses = table["address"]
+    first = pc.list_element(pc.if_else(pc.greater(pc.list_value_length(addresses), 0),
+                                       addresses, pa.scalar(None, addresses.type)), 0)
+    return {k: pc.struct_field(first, k) for k in ADDRESS_FIELDS}
+
+
+def load_sources(path=None, raw_json=False):
+    """
+    NORMALIZED_SOURCES as a DataFrame with typed columns:
+      phone / website / socials: list of str, or None
+      categories: {"primary": str, "alternate": [str]}, or None
+      address: list of {freeform, locality, postcode, region, country}, or None
+    plus flattened helper columns:
+      category_primary, category_alternate
+      freeform, locality, postcode, region, country (first address)
+      addr_line: "freeform locality region postcode" of the first address
+    With raw_json=True, also <col>_json for every LIST_COLUMNS entry: the JSON
+    text exactly as in the CSV ("" when missing), for outputs that pass it through.
+    """
+    table = read_sources_table(path or default_sources_path())
+
+    parts = first_address_parts(table)
+    addr = pc.binary_join_element_wise(
+        *[pc.fill_null(parts[k], "") for k in ("freeform", "locality", "region", "postcode")], " ")
+    addr = pc.utf8_trim_whitespace(pc.replace_substring_regex(addr, r"\s+", " "))
+
+    df = table.drop_columns(LIST_COLUMNS + RAW_JSON_COLUMNS).to_pandas()
+    for col in LIST_COLUMNS:
+        df[col] = pd.Series(table[col].to_pylist(), dtype=object)
+    df["category_primary"] = pc.struct_field(table["categories"], "primary").to_pandas()
+    df["category_alternate"] = pd.Series(pc.struct_field(table["categories"], "alternate").to_pylist(),
+                                         dtype=object)
+    for k, col in parts.items():
+        df[k] = col.to_pandas()
+    df["addr_line"] = pc.if_else(pc.equal(addr, ""), pa.scalar(None, pa.string()), addr).to_pandas()
+    if raw_json:
+        for col in RAW_JSON_COLUMNS:
+            df[col] = table[col].to_pandas()
+    return df
@@ -4,8 +4,8 @@ import geopandas as gpd
 from pathlib import Path
 
 # Paths
-YELP_OMF_FILE = "../data/interim/yelp_omf_matched.geojson"
-YELP_OVERPASS_FILE = "../data/interim/yelp_overpass_matched.geojson"
+YELP_OMF_FILE = "../data/interim/yelp_omf_matched.parquet"
+YELP_OVERPASS_FILE = "../data/interim/yelp_overpass_matched.parquet"
 OUT_FILE = "../data/processed/yelp_triplet_matches.csv"
 
 # Ensure output folder exists
@@ -14,8 +14,8 @@ Path("../data/processed").mkdir(exist_ok=True)
 # --------------------------------------------------------------
 # Load matched datasets
 # --------------------------------------------------------------
-yelp_omf = gpd.read_file(YELP_OMF_FILE)
-yelp_overpass = gpd.read_file(YELP_OVERPASS_FILE)
+yelp_omf = gpd.read_parquet(YELP_OMF_FILE)
+yelp_overpass = gpd.read_parquet(YELP_OVERPASS_FILE)
 
 print("Loaded Yelp→OMF columns:", yelp_omf.columns)
 print("Loaded Yelp→Overpass columns:", yelp_overpass.columns)
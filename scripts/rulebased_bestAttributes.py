@@ -1,13 +1,15 @@
+import numpy as np
 import pandas as pd
-import json, re
-from collections import Counter
+import re
 from pathlib import Path
 
+from normalized_sources import load_sources
+
 # --- CONFIGURATION ---
 BASE_DIR = Path(__file__).resolve().parent.parent
 
 #INPUT_NORMALIZED = "NORMALIZED_SOURCES_SAMPLE_200.csv"
-INPUT_NORMALIZED = "NORMALIZED_SOURCES.csv"
+INPUT_NORMALIZED = None  # NORMALIZED_SOURCES.parquet if present, else NORMALIZED_SOURCES.csv
 OUTPUT_BEST = Path(__file__).resolve().parent / "RULE_BEST_ATTRIBUTES.csv"
 
 # Lower rank = Better source
@@ -18,10 +20,6 @@ SOURCE_PRIORITY = {
 BAD_DOMAINS = ["facebook.com", "instagram.com", "youtube.com", "twitter.com", "yelp.com"]
 
 # --- HELPER FUNCTIONS ---
-def safe_json(val):
-    try: return json.loads(str(val))
-    except: return None
-
 def get_rank(src): 
     return SOURCE_PRIORITY.get(str(src).lower().strip().replace("msft","microsoft").replace("four_square","foursquare"), 99)
 
@@ -34,128 +32,98 @@ def extract_domain(url):
     return u.split("/")[0].strip()
 
 # --- ATTRIBUTE RULES ---
+# Each rule works on the whole source frame at once (see prepare) and returns
+# the winning (value, source) per place_id, indexed by place_id. Ties keep the
+# earliest source row, like the per-place loops they replace.
+
+def source_ranks(sources):
+    """get_rank for a whole column, evaluated once per distinct source."""
+    codes, uniques = pd.factorize(sources, use_na_sentinel=False)
+    return np.array([get_rank(s) for s in uniques] or [99], dtype=np.int64)[codes]
+
+def prepare(df):
+    """Add the row position and source rank every rule sorts on."""
+    df = df[df["place_id"].notna()].copy()  # groupby("place_id") skipped these
+    df["pos"] = np.arange(len(df))
+    df["rank"] = source_ranks(df["source"])
+    return df
+
+def first_per_place(cand, value, by):
+    """(value, source) of the first candidate of each place after a stable sort on `by`."""
+    best = cand.sort_values(["place_id", *by], kind="stable").drop_duplicates("place_id")
+    return best.set_index("place_id")[[value, "source"]].set_axis(["value", "source"], axis=1)
 
 def rule_name(df):
     """Pick name based on Source Priority. (Simple & effective for clean sources)"""
     # Sort by source rank, return the first non-empty name
-    candidates = df[df["name"].notna() & (df["name"] != "")].copy()
-    if candidates.empty: return "", ""
-    
-    candidates["rank"] = candidates["source"].apply(get_rank)
-    best = candidates.sort_values("rank").iloc[0]
-    return best["name"], best["source"]
+    cand = df[df["name"].notna() & (df["name"] != "")]
+    return first_per_place(cand, "name", ["rank", "pos"])
 
 def rule_phone(df):
-    """Extract digits. Majority vote. Tie-break by Source Rank."""
-    candidates = []
-    for idx, row in df.iterrows():
-        digits = re.sub(r"\D", "", str(row.get("phone", "")))
-        if len(digits) >= 10: candidates.append((digits[-10:], idx)) # Keep last 10
-    
-    if not candidates: return "", ""
-    
+    """Extract digits. Majority vote (ties: number seen first). Tie-break by Source Rank."""
+    digits = pd.Series([re.sub(r"\D", "", " ".join(p)) if p else "" for p in df["phone"]],
+                       index=df.index, dtype=object)
+    cand = df.assign(num=digits.str[-10:])[digits.str.len() >= 10]  # Keep last 10
+
     # Majority Vote
-    counts = Counter(c[0] for c in candidates)
-    best_num = max(counts, key=counts.get) # Get most frequent number
-    
+    votes = (cand.groupby(["place_id", "num"], sort=False)
+                 .agg(count=("pos", "size"), first=("pos", "min")).reset_index())
+    winner = votes.sort_values(["place_id", "count", "first"], ascending=[True, False, True], kind="stable")
+    winner = winner.drop_duplicates("place_id")[["place_id", "num"]]
+
     # Find source of that number with best rank
-    matching_rows = [idx for num, idx in candidates if num == best_num]
-    best_idx = min(matching_rows, key=lambda i: get_rank(df.loc[i, "source"]))
-    return best_num, df.loc[best_idx, "source"]
-'''
-def rule_address(df):
-    """Parse JSON. Pick longest valid address from highest priority source."""
-    candidates = []
-    for idx, row in df.iterrows():
-        data = safe_json(row.get("address"))
-        if not data or not isinstance(data, list): continue
-        a = data[0] # taking first address obj
-        # Construct full string
-        full = f"{a.get('freeform','')} {a.get('locality','')} {a.get('region','')} {a.get('postcode','')}"
-        clean_full = clean_str(full)
-        if len(clean_full) > 10: # arbitrary 'valid enough' length
-            candidates.append((clean_full, idx))
-            
-    if not candidates: return "", ""
-    
-    # Sort by: Source Rank (asc), then Length (desc)
-    best_idx = sorted(candidates, key=lambda x: (get_rank(df.loc[x[1], "source"]), -len(x[0])))[0][1]
-    
-    # Return the original formatted string from that index (re-parsing for display)
-    raw_data = safe_json(df.loc[best_idx, "address"])[0]
-    nice_str = f"{raw_data.get('freeform','')} {raw_data.get('locality','')}, {raw_data.get('region','')} {raw_data.get('postcode','')}"
-    return nice_str, df.loc[best_idx, "source"]
-'''
+    cand = cand.merge(winner, on=["place_id", "num"])
+    return first_per_place(cand, "num", ["rank", "pos"])
 
 def rule_address(df):
-    """Pick first non-empty address (already normalized)."""
-    candidates = df[df["addr"].notna() & (df["addr"] != "")]
-    if candidates.empty: return "", ""
-    # pick the first row (or by source rank if you like)
-    best = candidates.sort_values("source", key=lambda s: s.apply(get_rank)).iloc[0]
-    return best["addr"], best["source"]
+    """Pick first non-empty address: the source's JSON address text, verbatim from the CSV or Parquet."""
+    cand = df[df["address_json"] != ""]
+    return first_per_place(cand, "address_json", ["rank", "pos"])
 
 def rule_website(df):
     """Pick non-social domain from best source."""
-    candidates = []
-    for idx, row in df.iterrows():
-        urls = safe_json(row.get("website"))
-        if not urls: continue
-        url_list = urls if isinstance(urls, list) else [urls]
-        for u in url_list:
-            if not u: continue
-            dom = extract_domain(u)
-            is_junk = any(bad in dom for bad in BAD_DOMAINS)
-            candidates.append((u, dom, is_junk, idx))
-            
-    if not candidates: return "", ""
-    
+    urls = df[["place_id", "pos", "rank", "source", "website"]].explode("website")
+    urls = urls[urls["website"].notna() & (urls["website"] != "")]
+    urls["junk"] = [any(bad in extract_domain(u) for bad in BAD_DOMAINS) for u in urls["website"]]
+
     # Filter junk unless it's the only option
-    clean_cands = [c for c in candidates if not c[2]]
-    final_pool = clean_cands if clean_cands else candidates
-    
-    # Sort by Source Rank
-    best_tuple = sorted(final_pool, key=lambda x: get_rank(df.loc[x[3], "source"]))[0]
-    return best_tuple[0], df.loc[best_tuple[3], "source"]
+    has_clean = (~urls["junk"]).groupby(urls["place_id"]).transform("any")
+    pool = urls[~urls["junk"] | ~has_clean]
+
+    # Sort by Source Rank (explode kept the url order within a row)
+    return first_per_place(pool, "website", ["rank", "pos"])
 
 def rule_category(df):
     """Pick longest category string from best source."""
-    candidates = []
-    for idx, row in df.iterrows():
-        cat = safe_json(row.get("categories"))
-        val = cat.get("primary") if isinstance(cat, dict) else str(cat)
-        if val and val != "None": candidates.append((val, idx))
-            
-    if not candidates: return "", ""
+    cand = df[df["category_primary"].notna() & (df["category_primary"] != "")]
+    cand = cand.assign(neg_len=-cand["category_primary"].str.len())
     # Sort by Rank (asc), then Length (desc) - assuming longer is more specific
-    best = sorted(candidates, key=lambda x: (get_rank(df.loc[x[1], "source"]), -len(x[0])))[0]
-    return best[0], df.loc[best[1], "source"]
+    return first_per_place(cand, "category_primary", ["rank", "neg_len", "pos"])
+
+RULES = {
+    "best_name": rule_name, "best_phone": rule_phone, "best_address": rule_address,
+    "best_website": rule_website, "best_category": rule_category,
+}
 
 # --- MAIN EXECUTION ---
 def run_conflation():
-    df = pd.read_csv(INPUT_NORMALIZED)
-    results = []
-
-    for pid, group in df.groupby("place_id"):
-        b_name, src_name = rule_name(group)
-        b_phone, src_phone = rule_phone(group)
-        b_addr, src_addr = rule_address(group)
-        b_web, src_web = rule_website(group)
-        b_cat, src_cat = rule_category(group)
-
-        # Determine Best Source (Source that won the most fields)
-        srcs = [s for s in [src_name, src_phone, src_addr, src_web, src_cat] if s]
-        best_overall = max(set(srcs), key=srcs.count) if srcs else ""
-
-        results.append({
-            "place_id": pid,
-            "best_source": best_overall,
-            "best_name": b_name, "best_phone": b_phone,
-            "best_address": b_addr, "best_website": b_web, "best_category": b_cat
-        })
-
-    pd.DataFrame(results).to_csv(OUTPUT_BEST, index=False)
-    print(f"Done. Wrote {len(results)} rows to {OUTPUT_BEST}")
+    df = prepare(load_sources(INPUT_NORMALIZED, raw_json=True))
+    places = pd.Index(sorted(df["place_id"].unique()), name="place_id")
+    winners = {col: rule(df).reindex(places) for col, rule in RULES.items()}
+
+    # Determine Best Source (Source that won the most fields)
+    won = zip(*(w["source"].fillna("").tolist() for w in winners.values()))
+    best_source = []
+    for row in won:
+        srcs = [s for s in row if s]
+        best_source.append(max(set(srcs), key=srcs.count) if srcs else "")
+
+    out = pd.DataFrame({"place_id": places, "best_source": best_source})
+    for col, w in winners.items():
+        out[col] = w["value"].fillna("").to_numpy()
+
+    out.to_csv(OUTPUT_BEST, index=False)
+    print(f"Done. Wrote {len(out)} rows to {OUTPUT_BEST}")
 
 if __name__ == "__main__":
     run_conflation()
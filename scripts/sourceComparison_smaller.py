@@ -1,25 +1,23 @@
+import argparse
 import json
+import math
 import pandas as pd
 from rapidfuzz import fuzz
-import re
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+
+from yelp_loader import load_yelp_business, normalize_validator_batch, VALIDATOR_FIELDS, clean_text, clean_phone
+from blocking import (common_name_tokens, build_block_index, block_candidates, phone_matches,
+                      report_blocking_recall, calculate_score_above)
+
+USE_BLOCKING = True  # only score OMF/Yelp pairs sharing a blocking key (see blocking.py)
+GOLDEN_FILE = "RULE_GOLDEN_DATASET.csv"  # used to report the recall lost to blocking
+MATCHABLE_SCORE = 55  # best scores below this cannot change any counter or output row
 
 # ============================
 # HELPERS
 # ============================
 
-def clean_text(x):
-    if not x:
-        return ""
-    x = str(x).lower()
-    x = re.sub(r"[^a-z0-9 ]", " ", x)
-    return re.sub(r"\s+", " ", x).strip()
-
-def clean_phone(p):
-    if not p:
-        return ""
-    p = re.sub(r"\D", "", str(p))
-    return p[-10:] if len(p) >= 10 else p
-
 def to_json_list(x):
     if pd.isna(x) or x == "":
         return json.dumps([])
@@ -52,22 +50,9 @@ def load_omf(path):
 
 
 def load_yelp(path):
-    rows = []
-    with open(path, "r", encoding="utf-8") as f:
-        for line in f:
-            try:
-                obj = json.loads(line)
-            except:
-                continue
-            rows.append({
-                "business_id": obj.get("business_id"),
-                "name": clean_text(obj.get("name")),
-                "addr": clean_text(obj.get("address", "")),
-                "phone": clean_phone(obj.get("phone")),
-                "categories": clean_text(str(obj.get("categories", ""))),
-                "city": clean_text(obj.get("city", ""))  # <-- include city here
-            })
-    return pd.DataFrame(rows)
+    df = load_yelp_business(path, VALIDATOR_FIELDS, normalize_validator_batch)
+    df["addr"] = df["street"]  # this script matches on the street line only
+    return df[["business_id", "name", "addr", "phone", "categories", "city"]]
 
 '''
 # ============================
@@ -138,27 +123,29 @@ def calculate_score(omf_row, yelp_row):
     ad = fuzz.token_sort_ratio(omf_row["addr"], yelp_row["addr"])
     return (0.65 * ns) + (0.35 * ad)
 
-def validate(omf_df, yelp_df):
+def match_city(omf_city, yelp_records, phone_hits, common, use_blocking):
+    """
+    Match the OMF records of one city against that city's Yelp records.
+    phone_hits only needs the entries for omf_city's labels. Cities are
+    independent, so validate can run this in worker processes.
+    Returns (matchable, [(omf label, valid row), ...], pair counters).
+    """
     matchable = 0
-    valid = 0
     valid_rows = []
+    stats = Counter()
+    block_index = build_block_index(yelp_records, common) if use_blocking else None
 
-    # Group Yelp by city for fast lookup
-    print("Indexing Yelp data by city...")
-    yelp_lookup = {}
-    for city, group in yelp_df.groupby("city"):
-        if city:
-            yelp_lookup[city] = group.to_dict('records')
-
-    print("Matching OMF records...")
-    for _, omf in omf_df.iterrows():
-        city = omf["city"]
-        if not city or city not in yelp_lookup:
-            continue  # skip if city missing or no Yelp records
-
-        candidates = yelp_lookup[city]
+    for label, omf in omf_city.iterrows():
+        candidates = yelp_records
+        stats["pairs_total"] += len(candidates)
         best_score = 0
         best_record = None
+        if label in phone_hits:  # resolved by the phone hash join
+            best_score, best_record = 100, phone_hits[label]
+            candidates = []
+        elif use_blocking:
+            candidates = [candidates[i] for i in block_candidates(block_index, omf, common)]
+        stats["pairs_scored"] += len(candidates)
         '''
         for y in candidates:
             score = calculate_score(omf, y)
@@ -169,8 +156,10 @@ def validate(omf_df, yelp_df):
                     break
 '''
         for y in candidates:
-            score = calculate_score(omf, y)
-            if score > best_score:
+            # a pair matters only if it beats the current best and reaches MATCHABLE_SCORE
+            score, skipped = calculate_score_above(omf, y, max(best_score, math.nextafter(MATCHABLE_SCORE, 0)))
+            stats["addr_skipped"] += skipped
+            if score is not None and score > best_score:
                 best_score = score
                 best_record = y
                 print(f"OMF: {omf['name']} / {omf['addr']}")
@@ -178,13 +167,11 @@ def validate(omf_df, yelp_df):
                 print(f"Score: {score}")
                 if best_score == 100:
                     break
-
-        if best_score >= 55:
+        if best_score >= MATCHABLE_SCORE:
             matchable += 1
 
         if best_score >= 75 and best_record:  # threshold for "valid" match
-            valid += 1
-            valid_rows.append({
+            valid_rows.append((label, {
                 "omf_place_id": omf["place_id"],
                 "omf_source": omf["source"],
                 "omf_name": omf["name"],
@@ -201,19 +188,67 @@ def validate(omf_df, yelp_df):
                 "yelp_categories": best_record["categories"],
 
                 "match_score": best_score
-            })
+            }))
 
-    return len(omf_df), matchable, valid, valid_rows
+    return matchable, valid_rows, stats
+
+def validate(omf_df, yelp_df, use_blocking=USE_BLOCKING, workers=1):
+    omf_df = omf_df.reset_index(drop=True)  # labels = positions, used to restore input order
+
+    # Group Yelp by city for fast lookup
+    print("Indexing Yelp data by city...")
+    yelp_lookup = {city: group.to_dict('records') for city, group in yelp_df.groupby("city") if city}
+    common = common_name_tokens(yelp_df["name"]) if use_blocking else set()
+
+    # Exact phone matches score 100; resolve them with one hash join up front
+    phone_hits = phone_matches(omf_df, yelp_df)
+    print(f"Phone hash join: {len(phone_hits):,} OMF records matched by phone")
+
+    # One task per city (OMF records without a city or without Yelp records are skipped),
+    # largest first (OMF x Yelp pairs) so the big cities don't end up as stragglers
+    tasks = []
+    for city, omf_city in omf_df[omf_df["city"].isin(yelp_lookup.keys())].groupby("city"):
+        city_hits = {label: phone_hits[label] for label in omf_city.index if label in phone_hits}
+        tasks.append((omf_city, yelp_lookup[city], city_hits, common, use_blocking))
+    tasks.sort(key=lambda t: len(t[0]) * len(t[1]), reverse=True)
+
+    print(f"Matching OMF records in {len(tasks):,} cities ({workers} worker(s))...")
+    if workers > 1:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            results = list(pool.map(match_city, *zip(*tasks)))
+    else:
+        results = [match_city(*task) for task in tasks]
+
+    matchable = sum(r[0] for r in results)
+    valid_rows = [row for _, row in sorted((lr for r in results for lr in r[1]), key=lambda lr: lr[0])]
+    stats = sum((r[2] for r in results), Counter())
+    pairs_total, pairs_scored = stats["pairs_total"], stats["pairs_scored"]
+
+    if use_blocking:
+        pruned = pairs_total - pairs_scored
+        print(f"Blocking + phone join: scored {pairs_scored:,} of {pairs_total:,} same-city pairs "
+              f"(pruned {pruned:,}, {pruned / max(1, pairs_total) * 100:.2f}%)")
+    print(f"Score cutoffs: skipped {stats['addr_skipped']:,} of {pairs_scored:,} address comparisons "
+          f"({stats['addr_skipped'] / max(1, pairs_scored) * 100:.2f}%)")
+
+    return len(omf_df), matchable, len(valid_rows), valid_rows
 
 # ============================
 # MAIN
 # ============================
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Validate OMF records against Yelp businesses.")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="match cities in this many worker processes (default 1 = serial)")
+    args = parser.parse_args()
+
     omf = load_omf("NORMALIZED_SOURCES_SAMPLE_5000.csv")  # or full CSV
     yelp = load_yelp("../data/raw/yelp_academic_dataset_business.json")
 
-    total, matchable, valid, valid_rows = validate(omf, yelp)
+    total, matchable, valid, valid_rows = validate(omf, yelp, workers=args.workers)
+    if USE_BLOCKING:
+        report_blocking_recall(omf, yelp, GOLDEN_FILE, common_name_tokens(yelp["name"]))
 
     print("\n=== MATCHING SUMMARY ===")
     print(f"Total OMF: {total}")
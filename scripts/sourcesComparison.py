@@ -1,23 +1,26 @@
+import argparse
 import json
+import math
+import numpy as np
 import pandas as pd
 from rapidfuzz import fuzz
-import re
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+
+from yelp_loader import load_yelp_business, normalize_validator_batch, VALIDATOR_FIELDS, clean_text, clean_phone
+from normalized_sources import load_sources
+from blocking import (common_name_tokens, build_block_index, block_candidates, phone_matches,
+                      report_blocking_recall, calculate_score_above)
+
+USE_BLOCKING = True  # only score OMF/Yelp pairs sharing a blocking key (see blocking.py)
+GOLDEN_FILE = "RULE_GOLDEN_DATASET.csv"  # used to report the recall lost to blocking
+MATCHABLE_SCORE = 55  # best scores below this cannot change any counter or output row
+VALID_SCORE = 75  # best scores from here on are valid matches (VALID_MATCHES.csv)
 
 # ======================================================
 # CLEANING HELPERS
 # ======================================================
 
-def clean_text(x):
-    if not x: return ""
-    x = str(x).lower()
-    x = re.sub(r"[^a-z0-9 ]", " ", x)
-    return re.sub(r"\s+", " ", x).strip()
-
-def clean_phone(p):
-    if not p: return ""
-    p = re.sub(r"\D", "", str(p))
-    return p[-10:] if len(p) >= 10 else p
-
 def safe_json(val):
     """Helper to safely parse JSON or return empty list"""
     if pd.isna(val) or val == "": return []
@@ -46,53 +49,32 @@ def extract_domain(urls):
 # DATA LOADING
 # ======================================================
 
-def load_omf(path):
-    df = pd.read_csv(path)
+def load_omf(path=None):
+    df = load_sources(path, raw_json=True)  # JSON columns come back parsed (normalized_sources.py)
     rows = []
-    for _, r in df.iterrows():
-        cats = safe_json(r.get("categories"))
-        websites = safe_json(r.get("website"))
-        socials = safe_json(r.get("socials"))
-        addr_list = safe_json(r.get("address"))
-        
+    for r in df.to_dict("records"):
+        websites = r["website"] or []
+        addr_list = r["address"] or []
+
         full_addr, street, city, state, postal, country = parse_address(addr_list)
 
         rows.append({
             "place_id": r["place_id"],
             "source": r["source"],
             "name": clean_text(r["name"]),
-            "phone": clean_phone(r.get("phone")),
+            "phone": clean_phone(" ".join(r["phone"] or [])),
             "domain": extract_domain(websites),
             "addr": full_addr,
             "street": street, "city": city, "state": state, "postal": postal, "country": country,
             # KEEP RAW JSON STRINGS FOR OUTPUT
-            "categories": json.dumps(cats),
-            "website": json.dumps(websites),
-            "socials": json.dumps(socials),
+            "categories": json.dumps(safe_json(r["categories_json"])),
+            "website": json.dumps(safe_json(r["website_json"])),
+            "socials": json.dumps(safe_json(r["socials_json"])),
         })
     return pd.DataFrame(rows)
 
 def load_yelp(path):
-    rows = []
-    with open(path, "r", encoding="utf-8") as f:
-        for line in f:
-            try: obj = json.loads(line)
-            except: continue
-            
-            street = clean_text(obj.get("address", ""))
-            city = clean_text(obj.get("city", ""))
-            state = clean_text(obj.get("state", ""))
-            postal = clean_text(obj.get("postal_code", ""))
-            
-            rows.append({
-                "business_id": obj.get("business_id"),
-                "name": clean_text(obj.get("name")),
-                "phone": clean_phone(obj.get("phone")),
-                "categories": clean_text(str(obj.get("categories", ""))),
-                "street": street, "city": city, "state": state, "postal": postal,
-                "addr": clean_text(f"{street} {city} {state} {postal}")
-            })
-    return pd.DataFrame(rows)
+    return load_yelp_business(path, VALIDATOR_FIELDS, normalize_validator_batch)
 
 # ======================================================
 # MATCHING LOGIC
@@ -108,39 +90,49 @@ def calculate_score(omf_row, yelp_row):
     ad = fuzz.token_sort_ratio(omf_row["addr"], yelp_row["addr"])
     return (0.65 * ns) + (0.35 * ad)
 
-def validate(omf_df, yelp_df):
+def match_city(omf_city, yelp_records, phone_hits, common, use_blocking, floor=MATCHABLE_SCORE):
+    """
+    Match the OMF records of one city against that city's Yelp records.
+    phone_hits only needs the entries for omf_city's labels. Cities are
+    independent, so validate can run this in worker processes. Pairs scoring
+    below floor are not tracked (threshold_sweep.py lowers it).
+    Returns (matchable, [(omf label, valid row), ...], pair counters,
+    [(omf label, best score, yelp business_id), ...] for bests >= floor).
+    """
     matchable = 0
-    valid = 0
     valid_rows = []
+    bests = []
+    stats = Counter()
+    block_index = build_block_index(yelp_records, common) if use_blocking else None
 
-    # OPTIMIZATION: Group Yelp by City into a dictionary for O(1) lookup
-    print("Indexing Yelp data by city...")
-    yelp_lookup = {}
-    for city, group in yelp_df.groupby("city"):
-        if city: yelp_lookup[city] = group.to_dict('records')
-
-    print("Matching OMF records...")
-    for _, omf in omf_df.iterrows():
-        # Fast lookup
-        candidates = yelp_lookup.get(omf["city"], [])
-        if not candidates: continue
-
+    for label, omf in omf_city.iterrows():
+        candidates = yelp_records
+        stats["pairs_total"] += len(candidates)
         best_score = 0
         best_record = None
+        if label in phone_hits:  # resolved by the phone hash join
+            best_score, best_record = 100, phone_hits[label]
+            candidates = []
+        elif use_blocking:
+            candidates = [candidates[i] for i in block_candidates(block_index, omf, common)]
+        stats["pairs_scored"] += len(candidates)
 
         for y in candidates:
-            score = calculate_score(omf, y)
-            if score > best_score:
+            # a pair matters only if it beats the current best and reaches floor
+            score, skipped = calculate_score_above(omf, y, max(best_score, math.nextafter(floor, 0)))
+            stats["addr_skipped"] += skipped
+            if score is not None and score > best_score:
                 best_score = score
                 best_record = y
                 if best_score == 100: break # Stop early if perfect match
 
-        if best_score >= 55: matchable += 1
-        
+        if best_score >= MATCHABLE_SCORE: matchable += 1
+        if best_record:
+            bests.append((label, best_score, best_record["business_id"]))
+
         # Threshold for "Valid" match
-        if best_score >= 75 and best_record:
-            valid += 1
-            valid_rows.append({
+        if best_score >= VALID_SCORE and best_record:
+            valid_rows.append((label, {
                 "omf_place_id": omf["place_id"],
                 "omf_source": omf["source"],
                 "omf_name": omf["name"],
@@ -157,19 +149,91 @@ def validate(omf_df, yelp_df):
                 "yelp_categories": best_record["categories"],
                 
                 "match_score": best_score
-            })
+            }))
 
-    return len(omf_df), matchable, valid, valid_rows
+    return matchable, valid_rows, stats, bests
+
+def match_cities(omf_df, yelp_df, use_blocking=USE_BLOCKING, workers=1, floor=MATCHABLE_SCORE):
+    """match_city over every city of omf_df (labels must be positions). Returns the match_city results."""
+    # OPTIMIZATION: Group Yelp by City into a dictionary for O(1) lookup
+    print("Indexing Yelp data by city...")
+    yelp_lookup = {city: group.to_dict('records') for city, group in yelp_df.groupby("city") if city}
+    common = common_name_tokens(yelp_df["name"]) if use_blocking else set()
+
+    # Exact phone matches score 100; resolve them with one hash join up front
+    phone_hits = phone_matches(omf_df, yelp_df)
+    print(f"Phone hash join: {len(phone_hits):,} OMF records matched by phone")
+
+    # One task per city (OMF records without a city or without Yelp records are skipped),
+    # largest first (OMF x Yelp pairs) so the big cities don't end up as stragglers
+    tasks = []
+    for city, omf_city in omf_df[omf_df["city"].isin(yelp_lookup.keys())].groupby("city"):
+        city_hits = {label: phone_hits[label] for label in omf_city.index if label in phone_hits}
+        tasks.append((omf_city, yelp_lookup[city], city_hits, common, use_blocking, floor))
+    tasks.sort(key=lambda t: len(t[0]) * len(t[1]), reverse=True)
+
+    print(f"Matching OMF records in {len(tasks):,} cities ({workers} worker(s))...")
+    if workers > 1:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            return list(pool.map(match_city, *zip(*tasks)))
+    return [match_city(*task) for task in tasks]
+
+def validate(omf_df, yelp_df, use_blocking=USE_BLOCKING, workers=1):
+    omf_df = omf_df.reset_index(drop=True)  # labels = positions, used to restore input order
+    results = match_cities(omf_df, yelp_df, use_blocking, workers)
+
+    matchable = sum(r[0] for r in results)
+    valid_rows = [row for _, row in sorted((lr for r in results for lr in r[1]), key=lambda lr: lr[0])]
+    stats = sum((r[2] for r in results), Counter())
+    pairs_total, pairs_scored = stats["pairs_total"], stats["pairs_scored"]
+
+    if use_blocking:
+        pruned = pairs_total - pairs_scored
+        print(f"Blocking + phone join: scored {pairs_scored:,} of {pairs_total:,} same-city pairs "
+              f"(pruned {pruned:,}, {pruned / max(1, pairs_total) * 100:.2f}%)")
+    print(f"Score cutoffs: skipped {stats['addr_skipped']:,} of {pairs_scored:,} address comparisons "
+          f"({stats['addr_skipped'] / max(1, pairs_scored) * 100:.2f}%)")
+
+    return len(omf_df), matchable, len(valid_rows), valid_rows
+
+def best_matches(omf_df, yelp_df, floor=0, use_blocking=USE_BLOCKING, workers=1):
+    """
+    Best Yelp match of every OMF record, in input order: DataFrame(place_id,
+    source, yelp_business_id, match_score), the match empty where no pair
+    reaches floor. validate's counters and rows for any cutoffs >= floor
+    follow from it (threshold_sweep.py).
+    """
+    omf_df = omf_df.reset_index(drop=True)
+    results = match_cities(omf_df, yelp_df, use_blocking, workers, floor)
+    business_ids = np.full(len(omf_df), None, dtype=object)
+    scores = np.full(len(omf_df), np.nan)
+    for r in results:
+        for label, score, business_id in r[3]:
+            business_ids[label] = business_id
+            scores[label] = score
+    return pd.DataFrame({
+        "place_id": omf_df["place_id"].to_numpy(dtype=object),
+        "source": omf_df["source"].to_numpy(dtype=object),
+        "yelp_business_id": business_ids,
+        "match_score": scores,
+    })
 
 # ======================================================
 # MAIN EXECUTION
 # ======================================================
 
 if __name__ == "__main__":
-    omf = load_omf("NORMALIZED_SOURCES.csv")
+    parser = argparse.ArgumentParser(description="Validate OMF records against Yelp businesses.")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="match cities in this many worker processes (default 1 = serial)")
+    args = parser.parse_args()
+
+    omf = load_omf()  # NORMALIZED_SOURCES.parquet, else NORMALIZED_SOURCES.csv
     yelp = load_yelp("../data/raw/yelp_academic_dataset_business.json")
 
-    total, matchable, valid, valid_rows = validate(omf, yelp)
+    total, matchable, valid, valid_rows = validate(omf, yelp, workers=args.workers)
+    if USE_BLOCKING:
+        report_blocking_recall(omf, yelp, GOLDEN_FILE, common_name_tokens(yelp["name"]))
 
     print("\n=== VALIDATION SUMMARY ===")
     print(f"Total OMF: {total}")
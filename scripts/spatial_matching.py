@@ -0,0 +1,127 @@
+"""
+spatial_matching.py
+
+Array-based helpers for the Yelp -> OMF/Overpass matcher (matchingdatasets.py).
+Candidates are carried around as flat (source_idx, target_idx) arrays so a whole
+chunk can be scored with one rapidfuzz call instead of one extractOne per row.
+"""
+
+import numpy as np
+import shapely
+from rapidfuzz import fuzz
+from rapidfuzz.process import cpdist
+
+SCORING_WORKERS = -1  # rapidfuzz threads, -1 = all cores
+
+
+def candidate_pairs(source_geoms, target_sindex, target_geoms, max_distance):
+    """
+    All (source, target) pairs within max_distance, from one bulk sindex query.
+    source_geoms / target_geoms: arrays of shapely geometries in a metric CRS
+    Returns (src_idx, tgt_idx, dist) arrays, grouped by source position.
+    """
+    source_geoms = np.asarray(source_geoms, dtype=object)
+    src_idx, tgt_idx = target_sindex.query(source_geoms, predicate="dwithin", distance=max_distance)
+    dist = shapely.distance(source_geoms[src_idx], np.asarray(target_geoms, dtype=object)[tgt_idx])
+    return src_idx.astype(np.intp), tgt_idx.astype(np.intp), dist
+
+
+def nearest_k(source_geoms, target_sindex, target_geoms, max_distance, k=None):
+    """
+    Up to k nearest targets within max_distance for every source, in one pass.
+    Returns (src_idx, tgt_idx, dist) sorted by source, then distance (equal
+    distances by target position). k=None keeps every target inside the radius.
+    """
+    src_idx, tgt_idx, dist = candidate_pairs(source_geoms, target_sindex, target_geoms, max_distance)
+    order = np.lexsort((tgt_idx, dist, src_idx))
+    src_idx, tgt_idx, dist = src_idx[order], tgt_idx[order], dist[order]
+    if k is not None and len(src_idx):
+        starts = np.flatnonzero(np.r_[True, src_idx[1:] != src_idx[:-1]])
+        rank = np.arange(len(src_idx)) - np.repeat(starts, np.diff(np.r_[starts, len(src_idx)]))
+        keep = rank < k
+        src_idx, tgt_idx, dist = src_idx[keep], tgt_idx[keep], dist[keep]
+    return src_idx, tgt_idx, dist
+
+
+def grid_keys(cx, cy):
+    """Pack integer grid coordinates into one int64 key per cell."""
+    return (cx.astype(np.int64) << 32) | (cy.astype(np.int64) & 0xFFFFFFFF)
+
+
+def cell_assignments(geoms, cell_size, halo=0.0):
+    """
+    (row, cell key) pairs for every grid cell touched by the bounding box of
+    each geometry grown by halo. A point with halo=0 lands in exactly one cell;
+    empty geometries get none.
+    """
+    b = shapely.bounds(np.asarray(geoms, dtype=object))
+    rows = np.flatnonzero(~np.isnan(b).any(axis=1))
+    b = b[rows]
+    x0 = np.floor((b[:, 0] - halo) / cell_size).astype(np.int64)
+    y0 = np.floor((b[:, 1] - halo) / cell_size).astype(np.int64)
+    nx = np.floor((b[:, 2] + halo) / cell_size).astype(np.int64) - x0 + 1
+    ny = np.floor((b[:, 3] + halo) / cell_size).astype(np.int64) - y0 + 1
+
+    # enumerate the nx * ny cells of every row without a Python loop
+    count = nx * ny
+    rep = np.repeat(np.arange(len(rows)), count)
+    offset = np.arange(count.sum()) - np.repeat(np.cumsum(count) - count, count)
+    cx = x0[rep] + offset % nx[rep]
+    cy = y0[rep] + offset // nx[rep]
+    return rows[rep], grid_keys(cx, cy)
+
+
+def coverage_cells(target_geoms, cell_size):
+    """Keys of every grid cell touched by the bounding box of a target."""
+    return np.unique(cell_assignments(target_geoms, cell_size)[1])
+
+
+def covered_mask(source_geoms, cells, cell_size):
+    """
+    True for source points whose grid cell, or one of its 8 neighbours, holds
+    a target. With cell_size >= the match radius, a source outside this
+    footprint cannot have any candidate, so it can skip the spatial query.
+    """
+    source_geoms = np.asarray(source_geoms, dtype=object)
+    x = shapely.get_x(source_geoms)
+    y = shapely.get_y(source_geoms)
+    valid = ~(np.isnan(x) | np.isnan(y))
+    cx = np.floor(x[valid] / cell_size).astype(np.int64)
+    cy = np.floor(y[valid] / cell_size).astype(np.int64)
+
+    hit = np.zeros(valid.sum(), dtype=bool)
+    for dx in (-1, 0, 1):
+        for dy in (-1, 0, 1):
+            hit |= np.isin(grid_keys(cx + dx, cy + dy), cells)
+    mask = np.zeros(len(source_geoms), dtype=bool)
+    mask[valid] = hit
+    return mask
+
+
+def score_pairs(src_names, tgt_names, src_idx, tgt_idx, scorer=fuzz.WRatio, workers=None):
+    """
+    Fuzzy score of every (source, target) candidate pair.
+    src_names / tgt_names: object arrays of cleaned names ("" for missing)
+    Returns float64 scores aligned with src_idx / tgt_idx.
+    """
+    if len(src_idx) == 0:
+        return np.empty(0, dtype=np.float64)
+    return cpdist(
+        src_names[src_idx].tolist(),
+        tgt_names[tgt_idx].tolist(),
+        scorer=scorer,
+        dtype=np.float64,  # same precision as extractOne, keeps int(score) identical
+        workers=SCORING_WORKERS if workers is None else workers,
+    )
+
+
+def best_per_source(src_idx, scores):
+    """
+    Position (into the pair arrays) of the best scoring pair for each source.
+    Ties keep the earliest pair, same as process.extractOne.
+    """
+    if len(src_idx) == 0:
+        return np.empty(0, dtype=np.intp)
+    order = np.lexsort((-scores, src_idx))  # lexsort is stable
+    _, first = np.unique(src_idx[order], return_index=True)
+    return order[first]
@@ -0,0 +1,285 @@
+#!/usr/bin/env python3
+"""
+threshold_sweep.py
+
+Tune the matching thresholds from one scoring pass instead of a pipeline
+run per setting. Each stage scores its candidates once, stores the scores
+as Parquet in SWEEP_DIR (reused while the inputs and the scoring floor /
+radius are unchanged), then evaluates a grid of thresholds against the
+golden (omf place_id, yelp business_id) pairs:
+
+  validate  sourcesComparison.validate's best match per OMF record, scored
+            down to the lowest threshold of the grid. Grid: the matchable (55)
+            and valid (75) cutoffs of validate and MIN_MATCH_SCORE of
+            rulebased_goldenV2.py, applied to the valid rows.
+  spatial   matchingdatasets.py's candidate pairs (every target within the
+            largest --distance of a Yelp business) with distance and fuzzy
+            score. Grid: MAX_DISTANCE_METERS x FUZZY_SCORE_THRESHOLD.
+
+Per setting: match counts, and precision / recall of the accepted matches
+on the golden pairs whose OMF place (validate) or Yelp business (spatial)
+is in the input. The golden pairs are OMF places, so spatial --target
+overpass reports the counts only. Results are printed and written to
+SWEEP_DIR as CSV.
+
+Usage:
+  python threshold_sweep.py validate [--omf PATH] [--workers N]
+                                     [--matchable 45 55 ...] [--valid 70 75 ...] [--min-match 75 80 ...]
+  python threshold_sweep.py spatial [--target omf|overpass] [--distance 250 500 ...] [--fuzzy 70 80 ...]
+"""
+
+import argparse
+import json
+import os
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from blocking import load_golden_pairs
+from spatial_matching import best_per_source
+from yelp_loader import YELP_JSON, source_key
+
+SWEEP_DIR = Path("../data/interim/threshold_sweep")
+GOLDEN_FILE = "RULE_GOLDEN_DATASET.csv"
+
+MATCHABLE_GRID = [45, 50, 55, 60, 65]
+VALID_GRID = [65, 70, 75, 80, 85]
+MIN_MATCH_GRID = [75, 80, 85, 90]
+DISTANCE_GRID = [100, 250, 500, 1000, 2000]
+FUZZY_GRID = [60, 70, 80, 85, 90, 95]
+
+
+# ======================================================
+# STORED SCORES
+# ======================================================
+
+def stored_scores(path, key, compute, covers):
+    """
+    compute() (a DataFrame), stored at path with key in the Parquet metadata.
+    The stored scores are reused while covers(stored key) holds: same inputs,
+    scored down to the requested floor / out to the requested radius.
+    """
+    if path.exists():
+        meta = pq.read_schema(path).metadata or {}
+        stored = json.loads(meta.get(b"threshold_sweep", b"null"))
+        if stored and covers(stored):
+            print(f"Reusing scores from {path}")
+            return pq.read_table(path).to_pandas()
+
+    df = compute()
+    path.parent.mkdir(parents=True, exist_ok=True)
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    table = table.replace_schema_metadata({**(table.schema.metadata or {}),
+                                           b"threshold_sweep": json.dumps(key).encode("utf-8")})
+    tmp = Path(f"{path}.tmp")
+    pq.write_table(table, tmp)
+    os.replace(tmp, path)
+    print(f"Stored {len(df):,} scored rows in {path}")
+    return df
+
+
+def golden_hits(place_ids, business_ids, golden):
+    """True where (place_id, business_id) is a golden pair."""
+    return np.array([(p, b) in golden for p, b in zip(place_ids, business_ids)], dtype=bool)
+
+
+def ratio(a, b):
+    return a / b if b else float("nan")
+
+
+# ======================================================
+# validate: matchable / valid cutoffs, MIN_MATCH_SCORE
+# ======================================================
+
+def validate_scores(omf_path, yelp_path, floor, workers=1):
+    """Best match per OMF record at or above floor (sourcesComparison.best_matches), stored."""
+    from sourcesComparison import USE_BLOCKING, load_omf, load_yelp, best_matches
+
+    key = {"omf": source_key(omf_path), "yelp": source_key(yelp_path), "floor": floor, "blocking": USE_BLOCKING}
+    path = SWEEP_DIR / f"validate_{Path(omf_path).stem}_best.parquet"
+    return stored_scores(path, key,
+                         lambda: best_matches(load_omf(omf_path), load_yelp(yelp_path), floor, workers=workers),
+                         lambda stored: {**stored, "floor": floor} == key and stored["floor"] <= floor)
+
+
+def sweep_validate(best, golden, matchable_grid=MATCHABLE_GRID, valid_grid=VALID_GRID,
+                   min_match_grid=MIN_MATCH_GRID):
+    """
+    One row per (matchable, valid, min_match) setting: validate's counters,
+    then rulebased_goldenV2's accepted rows (valid rows scoring at least
+    min_match, first row per place_id) scored on the golden pairs.
+    """
+    score = best["match_score"].to_numpy()  # NaN (no match above the floor) fails every cutoff
+    places, _ = pd.factorize(best["place_id"])
+    golden_places = {p for p, _ in golden}
+    in_golden = best["place_id"].isin(golden_places).to_numpy()
+    hit = golden_hits(best["place_id"], best["yelp_business_id"], golden)
+    present = set(best["place_id"][in_golden])
+    n_golden = sum(p in present for p, _ in golden)
+
+    rows = []
+    for m in matchable_grid:
+        matchable = int((score >= m).sum())
+        for v in valid_grid:
+            valid = score >= v
+            for g in min_match_grid:
+                accepted = np.flatnonzero(valid & (score >= g))
+                _, first = np.unique(places[accepted], return_index=True)  # drop_duplicates("place_id")
+                accepted = accepted[np.sort(first)]
+                judged = accepted[in_golden[accepted]]
+                tp = int(hit[judged].sum())
+                rows.append({
+                    "matchable_score": m, "valid_score": v, "min_match_score": g,
+                    "total": len(best), "matchable": matchable, "valid": int(valid.sum()),
+                    "coverage": ratio(int(valid.sum()), matchable),
+                    "accepted": len(accepted), "review": int((valid & ~(score >= g)).sum()),
+                    "golden_judged": len(judged), "golden_tp": tp,
+                    "precision": ratio(tp, len(judged)), "recall": ratio(tp, n_golden),
+                })
+    return pd.DataFrame(rows)
+
+
+# ======================================================
+# spatial: MAX_DISTANCE_METERS x FUZZY_SCORE_THRESHOLD
+# ======================================================
+
+def record_candidates(target, max_distance):
+    """
+    Every Yelp row with its candidate pairs within max_distance of target
+    ("omf" / "overpass"): yelp_row, business_id, target_id, distance_m,
+    score, one row per pair in (yelp_row, distance) order; a Yelp row without
+    candidates gets one row with an empty target.
+    """
+    from matchingdatasets import load_inputs, candidate_scores, chunk_ranges
+
+    yelp_proj, omf_proj, overpass_proj = load_inputs()
+    target_proj = omf_proj if target == "omf" else overpass_proj
+    target_index = target_proj.sindex
+    tgt_ids = target_proj["id"].to_numpy(dtype=object)
+
+    src, tgt, dist, scores = [], [], [], []
+    ranges = chunk_ranges(len(yelp_proj))
+    for i, start, end in ranges:
+        s, t, d, sc = candidate_scores(yelp_proj.iloc[start:end], target_proj, target_index,
+                                       max_distance=max_distance)
+        lonely = np.setdiff1d(np.arange(end - start), s)  # rows without a candidate
+        order = np.argsort(np.concatenate([s, lonely]), kind="stable")
+        src.append((np.concatenate([s, lonely]) + start)[order])
+        tgt.append(np.concatenate([t, np.full(len(lonely), -1)])[order])
+        dist.append(np.concatenate([d, np.full(len(lonely), np.nan)])[order])
+        scores.append(np.concatenate([sc, np.full(len(lonely), np.nan)])[order])
+        print(f"  chunk {i + 1}/{len(ranges)}: {len(s):,} candidate pairs")
+
+    src, tgt = np.concatenate(src), np.concatenate(tgt)
+    return pd.DataFrame({
+        "yelp_row": src,
+        "business_id": yelp_proj["business_id"].to_numpy(dtype=object)[src],
+        "target_id": np.where(tgt >= 0, tgt_ids[np.maximum(tgt, 0)], None),
+        "distance_m": np.concatenate(dist),
+        "score": np.concatenate(scores),
+    })
+
+
+def spatial_scores(target, max_distance):
+    import matchingdatasets as md
+
+    target_file = md.OMF_GEOJSON if target == "omf" else md.OVERPASS_GEOJSON
+    key = {"yelp": source_key(YELP_JSON), "target": source_key(target_file),
+           "max_distance": max_distance, "k": md.NEAREST_K}
+    return stored_scores(SWEEP_DIR / f"yelp_{target}_candidates.parquet", key,
+                         lambda: record_candidates(target, max_distance),
+                         lambda stored: ({**stored, "max_distance": max_distance} == key
+                                         and stored["max_distance"] >= max_distance))
+
+
+def sweep_spatial(pairs, golden=None, distance_grid=DISTANCE_GRID, fuzzy_grid=FUZZY_GRID):
+    """
+    One row per (max distance, fuzzy threshold) setting: the Yelp rows
+    process_chunk would match (best candidate within the radius scoring at
+    least the threshold), scored on the golden pairs. Without golden pairs
+    (targets other than OMF) only the counts are reported.
+    """
+    src = pairs["yelp_row"].to_numpy()
+    dist = pairs["distance_m"].to_numpy()
+    score = pairs["score"].to_numpy()
+    golden = golden or set()
+    golden_business = {b for _, b in golden}
+    in_golden = pairs["business_id"].isin(golden_business).to_numpy()
+    hit = golden_hits(pairs["target_id"], pairs["business_id"], golden)
+    present = set(pairs["business_id"][in_golden])
+    n_golden = sum(b in present for _, b in golden)
+
+    rows = []
+    for d in distance_grid:
+        within = np.flatnonzero(dist <= d)  # NaN (no candidate) is never within
+        best = within[best_per_source(src[within], score[within])]
+        for f in fuzzy_grid:
+            matched = best[score[best] >= f]
+            judged = matched[in_golden[matched]]
+            tp = int(hit[judged].sum())
+            row = {
+                "max_distance_m": d, "fuzzy_threshold": f,
+                "yelp_rows": int(src.max()) + 1 if len(src) else 0,
+                "with_candidate": len(best), "matched": len(matched),
+            }
+            if golden:
+                row.update({"golden_judged": len(judged), "golden_tp": tp,
+                            "precision": ratio(tp, len(judged)), "recall": ratio(tp, n_golden)})
+            rows.append(row)
+    return pd.DataFrame(rows)
+
+
+# ======================================================
+# MAIN
+# ======================================================
+
+def report(results, out):
+    SWEEP_DIR.mkdir(parents=True, exist_ok=True)
+    results.to_csv(out, index=False)
+    with pd.option_context("display.max_rows", None, "display.width", 200):
+        print(results.round(4).to_string(index=False))
+    print(f"\nWrote {out}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Evaluate a grid of matching thresholds from one scoring pass.")
+    parser.add_argument("--golden", default=GOLDEN_FILE, help=f"golden pairs (default: {GOLDEN_FILE})")
+    stages = parser.add_subparsers(dest="stage", required=True)
+
+    v = stages.add_parser("validate", help="matchable / valid cutoffs and MIN_MATCH_SCORE")
+    v.add_argument("--omf", default=None, help="NORMALIZED_SOURCES file (default: as sourcesComparison.py)")
+    v.add_argument("--yelp", default=YELP_JSON, help=f"Yelp business JSON (default: {YELP_JSON})")
+    v.add_argument("--workers", type=int, default=1, help="cities matched in this many worker processes")
+    v.add_argument("--matchable", type=float, nargs="+", default=MATCHABLE_GRID)
+    v.add_argument("--valid", type=float, nargs="+", default=VALID_GRID)
+    v.add_argument("--min-match", type=float, nargs="+", default=MIN_MATCH_GRID)
+
+    s = stages.add_parser("spatial", help="MAX_DISTANCE_METERS and FUZZY_SCORE_THRESHOLD")
+    s.add_argument("--target", choices=["omf", "overpass"], default="omf")
+    s.add_argument("--distance", type=float, nargs="+", default=DISTANCE_GRID)
+    s.add_argument("--fuzzy", type=float, nargs="+", default=FUZZY_GRID)
+    args = parser.parse_args()
+
+    golden = None
+    if args.stage == "validate" or args.target == "omf":
+        golden = load_golden_pairs(args.golden)
+        print(f"{len(golden):,} golden pairs from {args.golden}")
+    else:
+        print(f"{args.golden} pairs OMF places with Yelp businesses: no precision / recall "
+              f"for --target {args.target}, match counts only")
+
+    if args.stage == "validate":
+        from normalized_sources import default_sources_path
+
+        omf_path = args.omf or default_sources_path()
+        floor = min(args.matchable + args.valid + args.min_match)
+        best = validate_scores(omf_path, args.yelp, floor, args.workers)
+        report(sweep_validate(best, golden, args.matchable, args.valid, args.min_match),
+               SWEEP_DIR / f"validate_{Path(omf_path).stem}_sweep.csv")
+    else:
+        pairs = spatial_scores(args.target, max(args.distance))
+        report(sweep_spatial(pairs, golden, args.distance, args.fuzzy),
+               SWEEP_DIR / f"yelp_{args.target}_sweep.csv")
@@ -0,0 +1,154 @@
+"""
+yelp_loader.py
+
+Shared loader for yelp_academic_dataset_business.json.
+The file is streamed line by line with orjson (stdlib json if orjson is not
+installed), only the requested fields are kept, and an optional normalize
+function is applied per batch of rows. The result is cached as Parquet in
+CACHE_DIR, keyed by the JSON file's mtime and size plus the fields and the
+normalizer (its name and a hash of its module's source), so later runs just
+read the cache.
+clean_text / clean_phone are the validators' cleaning helpers;
+sourcesComparison.py and sourceComparison_smaller.py import them from here.
+"""
+
+import hashlib
+import inspect
+import json
+import os
+import re
+from pathlib import Path
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+try:
+    import orjson
+    loads = orjson.loads
+except ImportError:
+    loads = json.loads
+
+YELP_JSON = "../data/raw/yelp_academic_dataset_business.json"
+CACHE_DIR = Path("../data/interim/yelp_cache")
+BATCH_SIZE = 100_000
+
+# fields of the validators' normalized Yelp frame (see normalize_validator_batch)
+VALIDATOR_FIELDS = ["business_id", "name", "phone", "categories", "address", "city", "state", "postal_code"]
+
+
+# ======================================================
+# BATCH NORMALIZERS
+# ======================================================
+
+def clean_text(x):
+    if not x: return ""
+    x = str(x).lower()
+    x = re.sub(r"[^a-z0-9 ]", " ", x)
+    return re.sub(r"\s+", " ", x).strip()
+
+
+def clean_phone(p):
+    if not p: return ""
+    p = re.sub(r"\D", "", str(p))
+    return p[-10:] if len(p) >= 10 else p
+
+
+def values(s):
+    """Column values as a list, with None for missing (a str column holds NaN for JSON null)."""
+    return s.astype(object).where(s.notna(), None).tolist()
+
+
+def normalize_validator_batch(df):
+    """
+    Yelp rows exactly as load_yelp / load_and_normalize_yelp used to build them:
+    business_id, name, phone, categories, street, city, state, postal, addr.
+    """
+    street = [clean_text(x) for x in values(df["address"])]
+    city = [clean_text(x) for x in values(df["city"])]
+    state = [clean_text(x) for x in values(df["state"])]
+    postal = [clean_text(x) for x in values(df["postal_code"])]
+    return pd.DataFrame({
+        "business_id": values(df["business_id"]),
+        "name": [clean_text(x) for x in values(df["name"])],
+        "phone": [clean_phone(x) for x in values(df["phone"])],
+        # str() first, like clean_text(str(categories)): a null category list becomes "none"
+        "categories": [clean_text(str(x)) for x in values(df["categories"])],
+        "street": street, "city": city, "state": state, "postal": postal,
+        "addr": [clean_text(f"{a} {b} {c} {d}") for a, b, c, d in zip(street, city, state, postal)],
+    })
+
+
+# ======================================================
+# LOADING + CACHE
+# ======================================================
+
+def iter_batches(path, fields, batch_size=BATCH_SIZE):
+    """DataFrames of up to batch_size rows holding only `fields`; unparseable lines are skipped."""
+    batch = []
+    with open(path, "rb") as f:
+        for line in f:
+            try:
+                obj = loads(line)
+            except ValueError:
+                continue
+            batch.append([obj.get(k) for k in fields])
+            if len(batch) >= batch_size:
+                yield pd.DataFrame(batch, columns=fields)
+                batch = []
+    if batch:
+        yield pd.DataFrame(batch, columns=fields)
+
+
+def normalizer_tag(normalize):
+    """Name and source hash of the normalizer's module, so editing it (or its helpers) invalidates the cache."""
+    if normalize is None:
+        return None
+    try:
+        src = inspect.getsource(inspect.getmodule(normalize))
+    except (TypeError, OSError):  # no source available: fall back to the name only
+        src = ""
+    return [normalize.__qualname__, hashlib.sha1(src.encode("utf-8")).hexdigest()[:12]]
+
+
+def cache_path(path, fields, normalize):
+    tag = json.dumps([fields, normalizer_tag(normalize)])
+    return CACHE_DIR / f"{Path(path).stem}_{hashlib.sha1(tag.encode('utf-8')).hexdigest()[:12]}.parquet"
+
+
+def source_key(path):
+    st = os.stat(path)
+    return {"source": str(Path(path).resolve()), "mtime_ns": st.st_mtime_ns, "size": st.st_size}
+
+
+def load_yelp_business(path=YELP_JSON, fields=VALIDATOR_FIELDS, normalize=None, use_cache=True):
+    """
+    Yelp businesses with only the given fields, normalize(batch) applied to
+    every batch. Reads the Parquet cache when it was written for the same
+    file (mtime + size), fields and normalizer code; otherwise parses the JSON
+    and (re)writes the cache.
+    """
+    fields = list(fields)
+    cached = cache_path(path, fields, normalize)
+    key = source_key(path)
+
+    if use_cache and cached.exists():
+        meta = pq.read_schema(cached).metadata or {}
+        if json.loads(meta.get(b"yelp_cache", b"{}")) == key:
+            print(f"Loading Yelp from cache {cached}")
+            return pq.read_table(cached).to_pandas()
+
+    print(f"Parsing {path}...")
+    batches = [normalize(b) if normalize else b for b in iter_batches(path, fields)]
+    df = pd.concat(batches, ignore_index=True) if batches else pd.DataFrame(columns=fields)
+
+    if use_cache:
+        CACHE_DIR.mkdir(parents=True, exist_ok=True)
+        table = pa.Table.from_pandas(df, preserve_index=False)
+        table = table.replace_schema_metadata({**(table.schema.metadata or {}),
+                                               b"yelp_cache": json.dumps(key).encode("utf-8")})
+        tmp = Path(f"{cached}.tmp")
+        pq.write_table(table, tmp)
+        os.replace(tmp, cached)
+        print(f"Cached Yelp ({len(df):,} rows) to {cached}")
+    return df